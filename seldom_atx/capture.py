@@ -0,0 +1,194 @@
+"""
+seldom_atx android frame capture
+"""
+import time
+import base64
+import threading
+import cv2
+import adbutils
+import numpy as np
+from typing import Iterator, Optional
+from seldom_atx.logging import log
+from seldom_atx.running.config import Seldom
+
+__all__ = ["screencap", "capture", "iter_jpeg", "FrameSource"]
+
+# screencap原始格式：PixelFormat -> 通道顺序
+PIXEL_FORMATS = {1: 'RGBA', 2: 'RGBX', 5: 'BGRA'}
+
+
+def screencap(device=None) -> np.ndarray:
+    """
+    原始screencap截图(不编码PNG)，返回RGB的NumPy数组(h, w, 3)
+    :param device: adbutils.AdbDevice，默认当前设备
+    """
+    if device is None:
+        device = adbutils.adb.device(serial=Seldom.driver.serial)
+    conn = device.shell(['screencap'], stream=True)
+    try:
+        chunks = []
+        while True:
+            chunk = conn.read(1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        conn.close()
+    data = b''.join(chunks)
+    width, height, fmt = np.frombuffer(data, dtype='<u4', count=3)
+    if fmt not in PIXEL_FORMATS:
+        raise ValueError(f"Unsupported screencap pixel format: {fmt}")
+    size = int(width) * int(height) * 4
+    # Android 9之后头部为16字节(多了colorspace)，之前为12字节
+    pixels = np.frombuffer(data, dtype=np.uint8, count=size, offset=len(data) - size)
+    pixels = pixels.reshape(int(height), int(width), 4)
+    if PIXEL_FORMATS[fmt] == 'BGRA':
+        return pixels[:, :, 2::-1]
+    return pixels[:, :, :3]
+
+
+def capture(region: tuple = None, scale: float = None, quality: int = 90, path: str = None,
+            device=None) -> np.ndarray:
+    """
+    截图为RGB的NumPy数组，不经过PNG编解码
+    :param region: 裁剪区域(lx, ly, rx, ry)，屏幕坐标
+    :param scale: 缩放比例(0, 1)，由设备上的uiautomator服务缩放后以JPEG传输，传输量按比例的平方减少
+    :param quality: 设备端缩放时的JPEG质量
+    :param path: 同时保存到文件，默认不保存
+    :param device: adbutils.AdbDevice，默认当前设备
+    """
+    if scale is not None and 0 < scale < 1:
+        data = base64.b64decode(Seldom.driver.jsonrpc.takeScreenshot(scale, quality))
+        frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)[:, :, ::-1]
+    else:
+        scale = 1
+        frame = screencap(device)
+    if region is not None:
+        # 裁剪只是切片，不复制像素
+        lx, ly, rx, ry = (int(v * scale) for v in region)
+        frame = frame[ly:ry, lx:rx]
+    if path is not None:
+        cv2.imwrite(path, frame[:, :, ::-1])
+    return frame
+
+
+def iter_jpeg(scale: float = 0.5, quality: int = 60):
+    """逐帧获取设备端缩放并编码的JPEG截图"""
+    while True:
+        yield base64.b64decode(Seldom.driver.jsonrpc.takeScreenshot(scale, quality))
+
+
+class FrameSource:
+    """
+    持续获取Android屏幕帧：后台线程按interval循环获取原始screencap，随时取到最新一帧
+    每一帧记录开始截图的时间，latest(since=...)只返回该时间之后截取的帧
+    Usage:
+    with FrameSource() as source:
+        frame = source.latest(since=time.time())
+        for frame in source.frames(timeout=5):
+            if ...:
+                break
+    """
+
+    def __init__(self, device=None, interval: float = 0.5):
+        """
+        :param device: adbutils.AdbDevice，默认当前设备
+        :param interval: 两次开始获取之间的最小间隔(s)，原始截图每帧约10MB，不宜过小
+        """
+        self._device = device
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0
+        self._seq = 0
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(name="frame-source", target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def timestamp(self) -> float:
+        """最新一帧开始截图的时间"""
+        return self._timestamp
+
+    def _run(self):
+        while self._running:
+            captured = time.time()
+            try:
+                frame = screencap(self._device)
+            except Exception as e:
+                log.warning(f"❗ Frame source: screencap error -> {e}.")
+                time.sleep(1)
+                continue
+            with self._cond:
+                self._frame, self._timestamp = frame, captured
+                self._seq += 1
+                self._cond.notify_all()
+            delay = captured + self.interval - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    def latest(self, max_age: float = None, since: float = None, timeout: float = None) -> np.ndarray:
+        """
+        最新一帧，没有启动、没有符合条件的帧时直接截图
+        :param max_age: 最新帧最多是多久(s)之前截取的
+        :param since: 只使用该时间之后开始截取的帧，如最近一次操作的时间
+        :param timeout: 等待符合since的新帧的时间(s)，默认interval的两倍
+        """
+        if timeout is None:
+            timeout = self.interval * 2
+        with self._cond:
+            if self._running and since is not None:
+                self._cond.wait_for(lambda: self._timestamp >= since or not self._running, timeout)
+            frame, timestamp = self._frame, self._timestamp
+        if self._running and frame is not None and (max_age is None or time.time() - timestamp <= max_age) \
+                and (since is None or timestamp >= since):
+            return frame
+        return screencap(self._device)
+
+    def next(self, timeout: float = None) -> Optional[np.ndarray]:
+        """等待下一帧，超时返回None"""
+        with self._cond:
+            seq = self._seq
+            self._cond.wait_for(lambda: self._seq != seq or not self._running, timeout)
+            return self._frame if self._seq != seq else None
+
+    def frames(self, timeout: float = None) -> Iterator[np.ndarray]:
+        """
+        逐帧迭代新的屏幕帧，用于视觉等待
+        :param timeout: 超时(s)后结束迭代，默认不超时
+        """
+        if not self._running:
+            self.start()
+        deadline = None if timeout is None else time.time() + timeout
+        while self._running:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return
+            frame = self.next(remaining)
+            if frame is not None:
+                yield frame
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -1,13 +1,15 @@
 """
 seldom_atx test case
 """
+import os
 import time
 import wda
 import uiautomator2
 import unittest
 from seldom_atx.u2driver import U2Driver
 from seldom_atx.wdadriver import WDADriver
-from seldom_atx.running.config import Seldom, AppConfig
+from seldom_atx.screenshot import ScreenshotWriter
+from seldom_atx.running.config import Seldom, AppConfig, OUTPUT_DIR
 from seldom_atx.logging import log
 from seldom_atx.logging.exceptions import NotFindElementError
 
@@ -49,13 +51,46 @@ class TestCase(unittest.TestCase):
 
     def setUp(self):
         self.images = []
+        if AppConfig.FLIGHT_RECORDER and hasattr(self, 'start_flight_recorder'):
+            self.start_flight_recorder().clear()
         self.start()
 
     def tearDown(self):
         self.end()
+        self.save_flight_record()
         """upload performance related chart data"""
+        ScreenshotWriter.flush()
         self.images = AppConfig.REPORT_IMAGE
 
+    def _failed(self) -> bool:
+        """
+        Whether the test method has failed, checked in tearDown.
+        """
+        outcome = getattr(self, '_outcome', None)
+        if outcome is None:
+            return False
+        # Python < 3.11 collects the errors on the outcome until the test is finished
+        errors = getattr(outcome, 'errors', None)
+        if errors is not None:
+            return any(exc_info is not None for _, exc_info in errors)
+        result = outcome.result
+        return any(test is self for test, _ in getattr(result, 'failures', []) + getattr(result, 'errors', []))
+
+    def save_flight_record(self) -> None:
+        """
+        Save the frames kept by the flight recorder as a video when the case failed.
+        """
+        recorder = getattr(self, 'flight_recorder', None)
+        if recorder is None or not self._failed():
+            return
+        folder = os.path.join(str(OUTPUT_DIR), 'flight')
+        os.makedirs(folder, exist_ok=True)
+        output = os.path.join(folder, f'{self.id()}_{time.strftime("%Y_%m_%d_%H_%M_%S")}.mp4')
+        try:
+            recorder.save(output)
+        except Exception as e:
+            log.error(f"❌ Save flight record error -> {e}.")
+
     @property
     def driver(self):
         """
@@ -101,11 +136,28 @@ class TestCaseU2(TestCase, U2Driver):
         Seldom.driver = uiautomator2.connect_usb(Seldom.device_id)
         cls().start_class()
 
-    def assertElement(self, index: int = 0, msg: str = None, **kwargs) -> None:
-        """Asserts whether the element exists."""
+    def assertElement(self, index: int = 0, msg: str = None, locators: list = None, all_of: bool = False,
+                      **kwargs) -> None:
+        """
+        Asserts whether the element exists.
+        With locators, asserts whether any of them exists, with all_of=True whether all of them exist
+        in the same page.
+
+        Usage:
+        self.assertElement(text="Login")
+        self.assertElement(locators=[{"text": "Success"}, {"resourceId": "com.app:id/error"}])
+        self.assertElement(locators=[{"text": "Username"}, {"text": "Password"}], all_of=True)
+        """
         log.info("👀 assertElement.")
         if msg is None:
             msg = "No element found"
+        if locators:
+            if all_of:
+                elem = self.wait_all(locators, noLog=True) != []
+            else:
+                elem = self.wait_any(locators, noLog=True)[0] != -1
+            self.assertTrue(elem, msg=msg)
+            return
         try:
             self.get_elements(index=index, **kwargs)
             elem = True
@@ -114,21 +166,22 @@ class TestCaseU2(TestCase, U2Driver):
 
         self.assertTrue(elem, msg=msg)
 
-    def assertNotElement(self, index: int = 0, msg: str = None, **kwargs) -> None:
-        """Asserts if the element does not exist."""
+    def assertNotElement(self, index: int = 0, msg: str = None, duration: float = None, **kwargs) -> None:
+        """
+        Asserts if the element does not exist.
+        Checks the current page only, with duration it must stay absent for duration seconds.
+
+        Usage:
+        self.assertNotElement(text="Error")
+        self.assertNotElement(duration=2, text="Error")
+        """
         log.info("👀 assertNotElement.")
         if msg is None:
             msg = "Find the element"
-
-        timeout_backups = Seldom.timeout
-        Seldom.timeout = 2
-        try:
-            self.get_elements(index=index, **kwargs)
-            elem = True
-        except NotFindElementError:
-            elem = False
-
-        Seldom.timeout = timeout_backups
+        if duration:
+            elem = not self.absent_for(duration, index=index, **kwargs)
+        else:
+            elem = self.exists_now(index=index, **kwargs)
 
         self.assertFalse(elem, msg=msg)
 
@@ -141,16 +194,28 @@ class TestCaseWDA(TestCase, WDADriver):
         Seldom.driver = wda.USBClient(udid=Seldom.device_id)
         cls().start_class()
 
-    def assertElement(self, index: int = 0, msg: str = None, **kwargs) -> None:
+    def assertElement(self, index: int = 0, msg: str = None, locators: list = None, all_of: bool = False,
+                      **kwargs) -> None:
         """
         Asserts whether the element exists.
+        With locators, asserts whether any of them exists, with all_of=True whether all of them exist
+        in the same page.
 
         Usage:
-        self.assertElement(css="#id")
+        self.assertElement(name="Login")
+        self.assertElement(locators=[{"name": "Success"}, {"name": "Retry"}])
+        self.assertElement(locators=[{"name": "Username"}, {"name": "Password"}], all_of=True)
         """
         log.info("👀 assertElement.")
         if msg is None:
             msg = "No element found"
+        if locators:
+            if all_of:
+                elem = self.wait_all(locators, noLog=True) != []
+            else:
+                elem = self.wait_any(locators, noLog=True)[0] != -1
+            self.assertTrue(elem, msg=msg)
+            return
         try:
             self.get_element(index=index, **kwargs)
             elem = True
@@ -159,25 +224,21 @@ class TestCaseWDA(TestCase, WDADriver):
 
         self.assertTrue(elem, msg=msg)
 
-    def assertNotElement(self, index: int = 0, msg: str = None, **kwargs) -> None:
+    def assertNotElement(self, index: int = 0, msg: str = None, duration: float = None, **kwargs) -> None:
         """
         Asserts if the element does not exist.
+        Checks the current page only, with duration it must stay absent for duration seconds.
 
         Usage:
-        self.assertNotElement(css="#id")
+        self.assertNotElement(name="Error")
+        self.assertNotElement(duration=2, name="Error")
         """
         log.info("👀 assertNotElement.")
         if msg is None:
             msg = "Find the element"
-
-        timeout_backups = Seldom.timeout
-        Seldom.timeout = 2
-        try:
-            self.get_element(index=index, **kwargs)
-            elem = True
-        except NotFindElementError:
-            elem = False
-
-        Seldom.timeout = timeout_backups
+        if duration:
+            elem = not self.absent_for(duration, index=index, **kwargs)
+        else:
+            elem = self.exists_now(index=index, **kwargs)
 
         self.assertFalse(elem, msg=msg)
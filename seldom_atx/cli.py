@@ -186,6 +186,11 @@ def create_scaffold(project_name: str) -> None:
                                  DataBase.ELE_PAGE: DataBase.TYPE_TEXT},
             DataBase.CONFIG_TABLE: {DataBase.CONFIG_KEY: DataBase.TYPE_TEXT,
                                     DataBase.CONFIG_VALUE: DataBase.TYPE_TEXT},
+            DataBase.COORD_TABLE: {DataBase.COORD_PACKAGE: DataBase.TYPE_TEXT,
+                                   DataBase.COORD_ACTIVITY: DataBase.TYPE_TEXT,
+                                   DataBase.COORD_FINGERPRINT: DataBase.TYPE_TEXT,
+                                   DataBase.COORD_LOCATOR: DataBase.TYPE_TEXT,
+                                   DataBase.COORD_BOUNDS: DataBase.TYPE_TEXT},
             DataBase.PERF_TABLE: {DataBase.PERF_Device: DataBase.TYPE_TEXT,
                                   DataBase.PERF_DeviceName: DataBase.TYPE_TEXT,
                                   DataBase.PERF_TestCasePath: DataBase.TYPE_TEXT,
@@ -434,6 +439,7 @@ uiautomator2[image]==2.16.23
     db = SQLiteDB(db_path=db_file_path)
     create_table(db, DataBase.CONFIG_TABLE)
     create_table(db, DataBase.ELE_TABLE)
+    create_table(db, DataBase.COORD_TABLE)
     create_table(db, DataBase.PERF_TABLE)
 
 
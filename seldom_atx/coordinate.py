@@ -0,0 +1,120 @@
+"""
+seldom_atx coordinate cache
+"""
+import json
+from typing import Optional, Tuple
+from seldom_atx.logging import log
+from seldom_atx.running.config import Seldom
+from seldom_atx.hierarchy import Snapshot, UITree
+
+__all__ = ["CoordinateCache"]
+
+
+class CoordinateCache:
+    """
+    坐标缓存：(package, activity, 页面指纹, 定位方式) -> bounds，持久化在seldom_atx.db
+    只在快照模式(Seldom.snapshot)下已有页面快照时生效，命中时只发送一次点击，不再定位元素；
+    命中的坐标在下一次页面快照中校验，不一致时删除
+    """
+    table = None
+    # 待校验的命中: [(package, activity, fingerprint, locator, index, kwargs, bounds)]
+    pending = []
+    # (Snapshot.changed, (package, activity))：页面未被操作改变时复用，不重复dumpsys
+    _context = None
+
+    @classmethod
+    def _table(cls):
+        """延迟连接数据库，seldom_atx.utils依赖驱动模块，不能在模块顶层导入"""
+        if cls.table is None:
+            from seldom_atx.utils.sqlite import Coordinate
+            cls.table = Coordinate()
+            Snapshot.hooks.append(cls.validate)
+        return cls.table
+
+    @staticmethod
+    def locator(index: int = None, **kwargs) -> str:
+        return json.dumps({**kwargs, 'index': index or 0}, sort_keys=True, ensure_ascii=False)
+
+    @classmethod
+    def context(cls) -> Optional[Tuple[str, str]]:
+        """当前的(package, activity)，缓存到下一次改变页面的操作"""
+        if cls._context is not None and cls._context[0] == Snapshot.changed:
+            return cls._context[1]
+        try:
+            current = Seldom.driver.app_current()
+        except Exception as e:
+            log.warning(f"❗ Coordinate cache: get current activity error -> {e}.")
+            return None
+        context = current.get('package', ''), current.get('activity', '')
+        cls._context = Snapshot.changed, context
+        return context
+
+    @staticmethod
+    def snapshot() -> Optional[UITree]:
+        """已有的页面快照，只在快照模式下使用，不为缓存单独dump"""
+        if not Seldom.snapshot:
+            return None
+        return Snapshot.tree
+
+    @classmethod
+    def lookup(cls, index: int = None, **kwargs) -> Optional[Tuple[int, int, int, int]]:
+        """查找当前页面状态(已有快照的页面指纹)下缓存的坐标，命中后加入待校验列表"""
+        tree = cls.snapshot()
+        if tree is None:
+            return None
+        try:
+            table = cls._table()
+        except Exception as e:
+            log.warning(f"❗ Coordinate cache disabled -> {e}.")
+            Seldom.coordinate_cache = False
+            return None
+        context = cls.context()
+        if context is None:
+            return None
+        # 同一个activity滑动或弹窗后页面指纹不同，不能使用其他页面状态下的坐标
+        locator = cls.locator(index, **kwargs)
+        row = table.get(*context, locator, fingerprint=tree.fingerprint())
+        if row is None:
+            return None
+        fingerprint, bounds = row
+        cls.pending.append((*context, fingerprint, locator, index or 0, kwargs, bounds))
+        return bounds
+
+    @classmethod
+    def record(cls, index: int = None, **kwargs) -> None:
+        """在已有的页面快照中定位元素并缓存坐标，需在改变页面的操作之前调用"""
+        tree = cls.snapshot()
+        if tree is None or not tree.supports(**kwargs):
+            return
+        i = tree.nth(index or 0, **kwargs)
+        if i is None:
+            return
+        context = cls.context()
+        if context is None:
+            return
+        cls._table().set(*context, tree.fingerprint(), cls.locator(index, **kwargs), tree.bounds(i))
+
+    @classmethod
+    def click(cls, index: int = None, **kwargs) -> bool:
+        """命中缓存时直接点击缓存的坐标"""
+        bounds = cls.lookup(index, **kwargs)
+        if bounds is None:
+            return False
+        lx, ly, rx, ry = bounds
+        Seldom.driver.click((lx + rx) // 2, (ly + ry) // 2)
+        return True
+
+    @classmethod
+    def validate(cls, tree: UITree) -> None:
+        """
+        用下一次页面快照校验命中的坐标：
+        元素仍在页面上但bounds变化，说明点击没有生效，删除该缓存
+        """
+        pending, cls.pending = cls.pending, []
+        for package, activity, fingerprint, locator, index, kwargs, bounds in pending:
+            if not tree.supports(**kwargs):
+                continue
+            i = tree.nth(index, **kwargs)
+            if i is not None and tree.bounds(i) != bounds:
+                log.info(f"❗ Coordinate cache: {locator} moved, evict.")
+                cls._table().delete(package, activity, locator, fingerprint)
@@ -0,0 +1,454 @@
+"""
+seldom_atx UI hierarchy snapshot
+"""
+import re
+import time
+import heapq
+import hashlib
+import logging
+from array import array
+from collections import defaultdict
+from functools import wraps
+from typing import List, Optional, Tuple
+from lxml import etree
+from uiautomator2.xpath import strict_xpath
+from wda import xcui_element_types
+from seldom_atx.running.config import Seldom, Platform
+
+__all__ = ["UITree", "Snapshot", "SnapshotElement", "mutating"]
+
+# 定位方式对应dump_hierarchy中的节点属性
+ANDROID_ATTRIBUTES = {
+    'resourceId': 'resource-id',
+    'name': 'content-desc',
+    'text': 'text',
+    'className': 'class',
+}
+
+# 定位方式对应WDA /source中的节点属性，text为name的别名
+IOS_ATTRIBUTES = {
+    'name': 'name',
+    'text': 'name',
+    'label': 'label',
+    'value': 'value',
+    'className': 'type',
+}
+
+# 快照元素转发给设备端时不改变页面的操作，其他操作执行后快照失效
+READ_ONLY_OPERATIONS = frozenset([
+    'info', 'exists', 'get_text', 'bounds', 'center', 'wait', 'wait_gone', 'must_wait', 'count',
+    'screenshot', 'child', 'sibling', 'child_by_text', 'child_by_description', 'child_by_instance',
+    'parent', 'left', 'right', 'up', 'down', 'get_last_match', 'all', 'match',
+])
+
+# 计算页面指纹时忽略的易变属性
+VOLATILE_ATTRIBUTES = ('focused',)
+
+# 计算页面指纹时忽略的易变子树：状态栏、进度条、时钟
+VOLATILE_SUBTREES = [
+    {'resourceId': 'com.android.systemui:id/status_bar_container'},
+    {'className': 'android.widget.ProgressBar'},
+    {'className': 'android.widget.TextClock'},
+    {'className': 'XCUIElementTypeStatusBar'},
+    {'className': 'XCUIElementTypeProgressIndicator'},
+    {'className': 'XCUIElementTypeActivityIndicator'},
+]
+
+XPATH_NAMESPACES = {"re": "http://exslt.org/regular-expressions"}
+
+XCUI_TYPE_RE = re.compile(r'/(' + '|'.join(xcui_element_types.ELEMENTS) + r')\b')
+
+
+def parse_hierarchy(source: str):
+    """解析dump_hierarchy，节点名替换为className，与uiautomator2的xpath保持一致"""
+    root = etree.fromstring(source.encode('utf-8') if isinstance(source, str) else source)
+    for node in root.iter('node'):
+        node.tag = node.attrib.get('class', '').replace('$', '-') or 'node'
+    return root
+
+
+def parse_source(source: str):
+    """解析WDA /source"""
+    return etree.fromstring(source.encode('utf-8') if isinstance(source, str) else source)
+
+
+def android_bounds(node) -> Optional[Tuple[int, int, int, int]]:
+    """bounds="[0,0][1080,2340]" -> (0, 0, 1080, 2340)"""
+    bounds = node.attrib.get('bounds')
+    if bounds is None:
+        return None
+    lx, ly, rx, ry = map(int, re.findall(r"-?\d+", bounds))
+    return lx, ly, rx, ry
+
+
+def ios_bounds(node) -> Optional[Tuple[int, int, int, int]]:
+    """x/y/width/height -> (left, top, right, bottom)"""
+    attrib = node.attrib
+    if 'x' not in attrib:
+        return None
+    x, y = int(float(attrib['x'])), int(float(attrib['y']))
+    return x, y, x + int(float(attrib.get('width', 0))), y + int(float(attrib.get('height', 0)))
+
+
+def mutating(func):
+    """改变页面状态的操作，执行后快照失效"""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            Snapshot.invalidate()
+
+    return wrapper
+
+
+class UITree:
+    """
+    数组存储的页面节点表，dump一次，多次本地查询
+    哈希索引: 定位方式 -> 节点编号列表(按文档顺序)
+    空间索引: 网格 -> 与该网格相交的节点编号列表
+    """
+    CELL = 128
+
+    def __init__(self, root, attributes: dict, bounds_func, platform: str = Platform.Android) -> None:
+        self.root = root
+        self.attributes = attributes
+        self.platform = platform
+        self.nodes = []
+        self.parent = array('i')
+        self.depth = array('i')
+        self.left = array('i')
+        self.top = array('i')
+        self.right = array('i')
+        self.bottom = array('i')
+        self.columns = {by: [] for by in attributes}
+        # 默认易变子树下的页面指纹: {volatile: fingerprint}
+        self._fingerprints = {}
+        self.indexes = {by: defaultdict(list) for by in attributes}
+        self.grid = defaultdict(list)
+        self._ids = {}
+        for node in root.iter():
+            bounds = bounds_func(node)
+            if bounds is not None:
+                self._append(node, bounds)
+
+    @classmethod
+    def from_android(cls, source: str):
+        """从dump_hierarchy构建"""
+        return cls(parse_hierarchy(source), ANDROID_ATTRIBUTES, android_bounds, Platform.Android)
+
+    @classmethod
+    def from_ios(cls, source: str):
+        """从WDA /source构建"""
+        return cls(parse_source(source), IOS_ATTRIBUTES, ios_bounds, Platform.iOS)
+
+    def _append(self, node, bounds: Tuple[int, int, int, int]) -> None:
+        i = len(self.nodes)
+        parent = self._ids.get(node.getparent(), -1)
+        self._ids[node] = i
+        self.nodes.append(node)
+        self.parent.append(parent)
+        self.depth.append(self.depth[parent] + 1 if parent >= 0 else 0)
+        lx, ly, rx, ry = bounds
+        self.left.append(lx)
+        self.top.append(ly)
+        self.right.append(rx)
+        self.bottom.append(ry)
+        for by, attr in self.attributes.items():
+            value = node.attrib.get(attr, '')
+            self.columns[by].append(value)
+            self.indexes[by][value].append(i)
+        if rx <= lx or ry <= ly:
+            return
+        for cx in range(max(lx, 0) // self.CELL, max(rx - 1, 0) // self.CELL + 1):
+            for cy in range(max(ly, 0) // self.CELL, max(ry - 1, 0) // self.CELL + 1):
+                self.grid[(cx, cy)].append(i)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def supports(self, **kwargs) -> bool:
+        """定位方式是否能在本地查询"""
+        return all(by == 'xpath' or by in self.attributes for by in kwargs)
+
+    def _normalize(self, by: str, value):
+        if by == 'className' and self.platform == Platform.iOS and not value.startswith('XCUIElementType'):
+            return 'XCUIElementType' + value
+        return value
+
+    def find(self, **kwargs) -> List[int]:
+        """按定位方式查询，返回节点编号列表"""
+        if 'xpath' in kwargs:
+            return self.xpath(kwargs['xpath'])
+        conditions = [(by, self._normalize(by, value)) for by, value in kwargs.items()]
+        candidates = min((self.indexes[by].get(value, []) for by, value in conditions), key=len)
+        if len(conditions) == 1:
+            return list(candidates)
+        return [i for i in candidates if all(self.columns[by][i] == value for by, value in conditions)]
+
+    def xpath(self, xpath: str) -> List[int]:
+        """本地执行xpath，返回节点编号列表"""
+        if self.platform == Platform.iOS:
+            xpath = XCUI_TYPE_RE.sub(r'/XCUIElementType\g<1>', xpath)
+        else:
+            xpath = strict_xpath(xpath, logger=logging.getLogger(__name__))
+        matches = self.root.xpath(xpath, namespaces=XPATH_NAMESPACES)
+        return sorted(self._ids[node] for node in matches if node in self._ids)
+
+    def nth(self, index: int = 0, **kwargs) -> Optional[int]:
+        """第index个匹配的节点"""
+        ids = self.find(**kwargs)
+        return ids[index] if len(ids) > index else None
+
+    def find_any(self, locators: List[dict]) -> Tuple[int, List[int]]:
+        """
+        多个定位方式中第一个能匹配到的，定位方式中的index表示需要至少匹配到index+1个元素
+        return: (定位方式的下标, 节点编号列表)，都不匹配时为(-1, [])
+        """
+        for n, locator in enumerate(locators):
+            locator = dict(locator)
+            index = locator.pop('index', None) or 0
+            ids = self.find(**locator)
+            if len(ids) > index:
+                return n, ids
+        return -1, []
+
+    def texts(self, classes: tuple = None):
+        """
+        按文档顺序逐个返回(文本, bounds)
+        :param classes: 只返回这些className的节点(包括文本为空的节点)，为空时返回所有有文本的节点
+        """
+        if classes:
+            index = self.indexes['className']
+            ids = heapq.merge(*(index.get(self._normalize('className', c), []) for c in classes))
+        else:
+            ids = range(len(self.nodes))
+        column = self.columns['text']
+        for i in ids:
+            text = column[i].strip()
+            if text or classes:
+                yield text, self.bounds(i)
+
+    def at(self, x: int, y: int) -> Optional[int]:
+        """坐标处最上层(层级最深)的节点"""
+        best = None
+        for i in self.grid.get((x // self.CELL, y // self.CELL), []):
+            if self.left[i] <= x < self.right[i] and self.top[i] <= y < self.bottom[i]:
+                if best is None or self.depth[i] >= self.depth[best]:
+                    best = i
+        return best
+
+    def subtree_end(self, i: int) -> int:
+        """节点i的子树在节点表中的结束位置(不含)"""
+        end = i + 1
+        while end < len(self.nodes) and self.depth[end] > self.depth[i]:
+            end += 1
+        return end
+
+    def fingerprint(self, volatile: tuple = VOLATILE_ATTRIBUTES, exclude: list = None) -> str:
+        """
+        归一化后的页面指纹
+        :param volatile: 忽略的易变属性
+        :param exclude: 忽略的易变子树(定位方式列表)，默认VOLATILE_SUBTREES，默认时结果会被缓存
+        """
+        if exclude is None:
+            key = tuple(volatile)
+            if key not in self._fingerprints:
+                self._fingerprints[key] = self.fingerprint(volatile, VOLATILE_SUBTREES)
+            return self._fingerprints[key]
+        skipped = []
+        for locator in exclude:
+            if self.supports(**locator):
+                skipped.extend((i, self.subtree_end(i)) for i in self.find(**locator))
+        skipped.sort(reverse=True)
+        digest = hashlib.blake2b(digest_size=16)
+        i = 0
+        while i < len(self.nodes):
+            while skipped and skipped[-1][1] <= i:
+                skipped.pop()
+            if skipped and skipped[-1][0] <= i:
+                i = skipped.pop()[1]
+                continue
+            attrib = self.nodes[i].attrib
+            items = ';'.join(f"{k}={v}" for k, v in sorted(attrib.items()) if k not in volatile)
+            digest.update(f"{self.depth[i]}|{items}\n".encode('utf-8'))
+            i += 1
+        return digest.hexdigest()
+
+    def bounds(self, i: int) -> Tuple[int, int, int, int]:
+        """left, top, right, bottom"""
+        return self.left[i], self.top[i], self.right[i], self.bottom[i]
+
+    def attribute(self, i: int, name: str, default: str = '') -> str:
+        """节点的原始属性"""
+        return self.nodes[i].attrib.get(name, default)
+
+
+class Snapshot:
+    """
+    页面快照：每个页面状态只dump一次hierarchy，所有定位在本地完成
+    任何改变页面的操作(click/set_text/swipe/press/launch_app...)都会使快照失效
+    """
+    source = None
+    tree = None
+    # 每次dump后的回调，参数为新的UITree，如坐标缓存的校验
+    hooks = []
+    # 最近一次改变页面的操作结束的时间
+    changed = 0.0
+
+    @classmethod
+    def current(cls) -> UITree:
+        """当前页面的快照，没有时重新dump"""
+        if cls.tree is None:
+            cls.refresh()
+        return cls.tree
+
+    @classmethod
+    def refresh(cls) -> UITree:
+        """重新dump当前页面"""
+        if Seldom.platform_name == Platform.iOS:
+            cls.source = Seldom.driver.source()
+            cls.tree = UITree.from_ios(cls.source)
+        else:
+            cls.source = Seldom.driver.dump_hierarchy()
+            cls.tree = UITree.from_android(cls.source)
+        for hook in cls.hooks:
+            hook(cls.tree)
+        return cls.tree
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """快照失效"""
+        cls.source = None
+        cls.tree = None
+        cls.changed = time.time()
+
+    @classmethod
+    def find(cls, **kwargs) -> List[int]:
+        """在当前快照中查找元素"""
+        return cls.current().find(**kwargs)
+
+    @classmethod
+    def resolve(cls, index: int = 0, timeout: float = None, **kwargs) -> List[int]:
+        """
+        在快照中查找元素，快照中不存在时重新dump，直到超时
+        :param index: 需要至少匹配到index+1个元素
+        :param timeout: 超时时间，默认Seldom.timeout
+        """
+        if timeout is None:
+            timeout = Seldom.timeout
+        deadline = time.time() + timeout
+        ids = cls.find(**kwargs)
+        while len(ids) <= index and time.time() < deadline:
+            if cls.source is not None:
+                time.sleep(0.2)
+            cls.refresh()
+            ids = cls.find(**kwargs)
+        return ids if len(ids) > index else []
+
+
+class SnapshotElement:
+    """
+    快照中的元素，接口与uiautomator2的UiObject保持一致
+    读取类操作在本地完成，输入类操作交给设备端的selector
+    """
+
+    def __init__(self, tree: UITree, ids: List[int], locator, index: int = 0) -> None:
+        self.tree = tree
+        self.ids = ids
+        self.locator = locator
+        self.index = index
+        self.id = ids[index]
+
+    @property
+    def selector(self):
+        """设备端的元素对象"""
+        return self.locator.selector(self.index)
+
+    @property
+    def node(self):
+        return self.tree.nodes[self.id]
+
+    @property
+    def attrib(self):
+        return self.node.attrib
+
+    @property
+    def exists(self) -> bool:
+        return True
+
+    @property
+    def text(self) -> str:
+        return self.tree.columns['text'][self.id]
+
+    @property
+    def info(self) -> dict:
+        lx, ly, rx, ry = self.bounds()
+        return {
+            'text': self.text,
+            'className': self.tree.columns['className'][self.id],
+            'resourceName': self.tree.attribute(self.id, 'resource-id'),
+            'contentDescription': self.tree.attribute(self.id, 'content-desc'),
+            'packageName': self.tree.attribute(self.id, 'package'),
+            'enabled': self.tree.attribute(self.id, 'enabled') == 'true',
+            'bounds': {'left': lx, 'top': ly, 'right': rx, 'bottom': ry},
+        }
+
+    def bounds(self) -> Tuple[int, int, int, int]:
+        """left_top_x, left_top_y, right_bottom_x, right_bottom_y"""
+        return self.tree.bounds(self.id)
+
+    def center(self, offset: Tuple[float, float] = None) -> Tuple[int, int]:
+        xoff, yoff = offset or (0.5, 0.5)
+        lx, ly, rx, ry = self.bounds()
+        return int(lx + (rx - lx) * xoff), int(ly + (ry - ly) * yoff)
+
+    def get_text(self, timeout: float = None) -> str:
+        return self.text
+
+    def wait(self, exists: bool = True, timeout: float = None) -> bool:
+        if exists:
+            return True
+        return self.selector.wait_gone(timeout=timeout)
+
+    def wait_gone(self, timeout: float = None) -> bool:
+        return self.selector.wait_gone(timeout=timeout)
+
+    @mutating
+    def click(self, timeout: float = None, offset: Tuple[float, float] = None) -> None:
+        x, y = self.center(offset)
+        Seldom.driver.click(x, y)
+
+    @mutating
+    def set_text(self, text: str, timeout: float = None):
+        return self.selector.set_text(text)
+
+    @mutating
+    def clear_text(self, timeout: float = None):
+        return self.selector.clear_text()
+
+    @property
+    def count(self) -> int:
+        return len(self.ids)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int):
+        return SnapshotElement(self.tree, self.ids, self.locator, index)
+
+    def __iter__(self):
+        return (SnapshotElement(self.tree, self.ids, self.locator, i) for i in range(self.count))
+
+    def __getattr__(self, item):
+        """
+        其他未在本地实现的操作交给设备端
+        只读的操作直接转发，其他操作(long_click/drag_to/swipe...)执行后快照失效
+        """
+        if item.startswith('_') or item == 'selector':
+            raise AttributeError(item)
+        attr = getattr(self.selector, item)
+        if not callable(attr) or item in READ_ONLY_OPERATIONS:
+            return attr
+        return mutating(attr)
@@ -0,0 +1,18 @@
+"""
+seldom_atx polling
+"""
+
+
+def backoff(start: float = 0.05, factor: float = 1.5, maximum: float = 1.0):
+    """
+    自适应轮询间隔：从start开始，每次乘以factor，最大为maximum
+    Usage:
+    for interval in backoff():
+        if check():
+            break
+        time.sleep(interval)
+    """
+    interval = start
+    while True:
+        yield min(interval, maximum)
+        interval *= factor
@@ -0,0 +1,436 @@
+"""
+seldom_atx screen recording
+"""
+import io
+import os
+import re
+import time
+import subprocess
+import queue
+import collections
+import threading
+import cv2
+import imageio
+import imageio_ffmpeg
+from typing import List, Optional
+from seldom_atx.logging import log
+from seldom_atx.running.config import AppConfig
+
+__all__ = ["MJPEGWriter", "read_mjpeg", "FrameIndexWriter", "read_frame_index", "ConstantRateWriter",
+           "VideoEncoder", "encode_mjpeg", "iter_video", "NativeScreenrecord",
+           "FlightRecorder"]
+
+# 帧索引文件后缀：xxx.mjpeg.idx / xxx.mp4.idx，每帧一行，第一列为采集时间戳
+INDEX_SUFFIX = '.idx'
+
+
+class FrameIndexWriter:
+    """
+    录屏的帧索引：与视频同名的xxx.mp4.idx，视频的每一帧一行，内容为该帧画面的采集时间戳
+    """
+
+    def __init__(self, video_path: str):
+        self.path = video_path + INDEX_SUFFIX
+        self._file = open(self.path, 'w')
+
+    def append(self, timestamp: float) -> None:
+        self._file.write(f"{timestamp:.6f}\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_frame_index(video_path: str) -> Optional[List[float]]:
+    """读取录屏的帧索引，返回每一帧的采集时间戳，没有帧索引时返回None"""
+    path = video_path + INDEX_SUFFIX
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return [float(line.split(',')[0]) for line in f if line.strip()]
+
+
+class MJPEGWriter:
+    """
+    只追加写入的MJPEG容器，不解码也不编码，只保存原始JPEG和到达时间：
+    xxx.mjpeg      所有JPEG首尾相接，可以直接用 ffmpeg -f mjpeg 读取
+    xxx.mjpeg.idx  每帧一行：到达时间戳,偏移,长度
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self._offset = 0
+        self._data = open(path, 'wb')
+        self._index = open(path + INDEX_SUFFIX, 'w')
+
+    def append(self, jpeg, timestamp: float = None) -> None:
+        """追加一帧，jpeg可以是bytes或memoryview"""
+        if timestamp is None:
+            timestamp = time.time()
+        length = self._data.write(jpeg)
+        self._index.write(f"{timestamp:.6f},{self._offset},{length}\n")
+        self._offset += length
+        self.frames += 1
+
+    def close(self) -> None:
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_mjpeg(path: str):
+    """逐帧读取MJPEG容器，返回(到达时间戳, JPEG数据)"""
+    with open(path, 'rb') as data, open(path + INDEX_SUFFIX) as index:
+        for line in index:
+            timestamp, offset, length = line.strip().split(',')
+            data.seek(int(offset))
+            yield float(timestamp), data.read(int(length))
+
+
+class ConstantRateWriter:
+    """
+    按帧的时间戳写入固定帧率的视频：两帧之间重复上一帧，视频时长与真实时间一致
+    同时写入帧索引，重复的帧记录的是原始帧的采集时间
+    """
+
+    def __init__(self, output: str, fps: int = None):
+        self.fps = fps or AppConfig.FPS
+        self.frames = 0
+        self._writer = imageio.get_writer(output, fps=self.fps)
+        self._index = FrameIndexWriter(output)
+        self._next_tick = None
+        self._last = None
+        self._last_timestamp = None
+
+    def _write_last(self) -> None:
+        self._writer.append_data(self._last)
+        self._index.append(self._last_timestamp)
+        self.frames += 1
+
+    def append(self, frame, timestamp: float) -> None:
+        if self._next_tick is None:
+            self._next_tick = timestamp
+        while self._last is not None and self._next_tick < timestamp:
+            self._write_last()
+            self._next_tick += 1 / self.fps
+        self._last, self._last_timestamp = frame, timestamp
+
+    def close(self) -> None:
+        if self._last is not None:
+            self._write_last()
+        self._writer.close()
+        self._index.close()
+
+
+class VideoEncoder:
+    """
+    后台线程把JPEG帧编码为mp4，读取线程只负责入队：
+    队列有界，编码跟不上时丢弃新帧并计数，丢弃的时间段由上一帧补齐
+    """
+
+    def __init__(self, output: str, fps: int = None, maxsize: int = 256):
+        self.output = output
+        self.fps = fps
+        self.dropped = 0
+        self.received = 0
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._writer = None
+        self._error = None
+        self._thread = threading.Thread(name="encoder", target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, jpeg, timestamp: float) -> bool:
+        """入队一帧，队列已满时丢弃，返回是否入队"""
+        self.received += 1
+        try:
+            self._queue.put_nowait((bytes(jpeg), timestamp))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def _run(self):
+        try:
+            self._writer = ConstantRateWriter(self.output, fps=self.fps)
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                jpeg, timestamp = item
+                self._writer.append(imageio.imread(io.BytesIO(jpeg)), timestamp)
+            self._writer.close()
+        except Exception as e:
+            # 保存异常，close时在调用方重新抛出
+            self._error = e
+
+    def close(self) -> None:
+        """等待队列中的帧编码完成，编码线程异常退出时抛出该异常"""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(None, timeout=1.0)
+                break
+            except queue.Full:
+                continue
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        log.info(f"📷️ Encoded {self.output}: received {self.received} frames, dropped {self.dropped}.")
+
+
+def encode_mjpeg(path: str, output: str = None, fps: int = None) -> str:
+    """
+    把MJPEG容器编码为mp4，不丢帧
+    :param path: xxx.mjpeg
+    :param output: 默认与path同名的.mp4
+    :param fps: 视频帧率，默认AppConfig.FPS
+    """
+    if output is None:
+        output = os.path.splitext(path)[0] + '.mp4'
+    writer = ConstantRateWriter(output, fps=fps)
+    for timestamp, jpeg in read_mjpeg(path):
+        writer.append(imageio.imread(io.BytesIO(jpeg)), timestamp)
+    writer.close()
+    log.info(f"📷️ Encoded {path} -> {output}.")
+    return output
+
+
+def iter_video(path: str):
+    """逐帧读取视频，返回(PTS秒数, RGB帧)"""
+    cap = cv2.VideoCapture(path)
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            yield cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    finally:
+        cap.release()
+
+
+def _recorded_seconds(output: str) -> Optional[float]:
+    """
+    从screenrecord --verbose的输出中解析实际录制的时长(s)：
+    Encoder stopping; recorded 120 frames in 3 seconds
+    """
+    match = re.search(r'recorded \d+ frames in ([\d.]+) seconds', output or '')
+    return float(match.group(1)) if match else None
+
+
+class NativeScreenrecord:
+    """
+    Android设备端录屏：使用系统的screenrecord命令(硬件H.264编码)，每段最长180s，超过时自动分段
+    结束后拉取到本地，按每帧的PTS写入帧索引：只有一段时直接使用原视频，多段时不重新编码直接拼接
+    """
+    REMOTE = '/sdcard/seldom_atx_record_{}.mp4'
+    # 短于该时长的一段视为screenrecord启动失败
+    MIN_CHUNK_SECONDS = 0.5
+
+    def __init__(self, d, chunk: int = None):
+        self._d = d
+        self._chunk = min(chunk or AppConfig.RECORD_CHUNK_SECONDS, 180)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._filename = None
+        self._fps = None
+        # [(设备上的文件, 开始录制的时间)]
+        self._chunks = []
+
+    def __call__(self, filename: str, fps: int = None):
+        if self._thread is not None:
+            raise RuntimeError("screenrecord is already started")
+        self._filename = filename
+        self._fps = fps or AppConfig.FPS
+        self._chunks = []
+        self._stop_event.clear()
+        self._thread = threading.Thread(name="screenrecord", target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            remote = self.REMOTE.format(len(self._chunks))
+            called = time.time()
+            ret = self._d.shell(['screenrecord', '--verbose', '--time-limit', str(self._chunk), remote],
+                                timeout=self._chunk + 10)
+            ended = time.time()
+            recorded = _recorded_seconds(ret.output)
+            if not self._stop_event.is_set():
+                # 未请求结束时screenrecord失败或立即退出，不再重复启动
+                if ret.exit_code != 0:
+                    log.error(f"❌ screenrecord exited with {ret.exit_code} -> {ret.output.strip()}")
+                    self._stop_event.set()
+                    break
+                if (recorded or ended - called) < self.MIN_CHUNK_SECONDS:
+                    log.error(f"❌ screenrecord stopped after {ended - called:.2f}s -> {ret.output.strip()}")
+                    self._stop_event.set()
+                    break
+            # 编码器启动需要时间，从结束时间倒推录制的开始时间
+            started = ended - recorded if recorded else called
+            self._chunks.append((remote, max(called, started)))
+
+    def stop(self, timeout: float = 10.0) -> bool:
+        """
+        结束录屏，拉取视频并写入帧索引
+        Returns:
+            bool: whether video is recorded.
+        """
+        if self._thread is None:
+            raise RuntimeError("screenrecord is not started")
+        self._stop_event.set()
+        deadline = time.time() + timeout
+        while self._thread.is_alive() and time.time() < deadline:
+            # SIGINT让screenrecord正常写完mp4
+            self._d.shell('pkill -2 screenrecord || killall -2 screenrecord')
+            self._thread.join(1.0)
+        self._thread = None
+        return self._collect()
+
+    def _pull(self):
+        parts = []
+        for n, (remote, started) in enumerate(self._chunks):
+            local = f"{self._filename}.part{n}.mp4"
+            try:
+                self._d.pull(remote, local)
+                parts.append((local, started))
+            except Exception as e:
+                log.warning(f"❗ Pull {remote} error -> {e}.")
+            finally:
+                self._d.shell(['rm', '-f', remote])
+        return parts
+
+    def _concat(self, parts: List[str]) -> None:
+        """
+        用ffmpeg的concat demuxer拼接多段视频，不重新编码：
+        screenrecord的输出是可变帧率的，按固定帧率重新编码会改变播放速度
+        """
+        list_path = self._filename + '.concat.txt'
+        with open(list_path, 'w') as f:
+            for local in parts:
+                path = os.path.abspath(local).replace("'", "'\\''")
+                f.write(f"file '{path}'\n")
+        try:
+            subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', self._filename], check=True, capture_output=True)
+        finally:
+            os.remove(list_path)
+
+    def _collect(self) -> bool:
+        parts = self._pull()
+        if not parts:
+            return False
+        if len(parts) == 1:
+            local, started = parts[0]
+            with FrameIndexWriter(self._filename) as index:
+                for pts, _ in iter_video(local):
+                    index.append(started + pts)
+            os.replace(local, self._filename)
+        else:
+            with FrameIndexWriter(self._filename) as index:
+                for local, started in parts:
+                    for pts, _ in iter_video(local):
+                        index.append(started + pts)
+            self._concat([local for local, _ in parts])
+            for local, _ in parts:
+                os.remove(local)
+        log.info(f"📷️ Pulled {len(parts)} screenrecord chunk(s) -> {self._filename}.")
+        return True
+
+
+class FlightRecorder:
+    """
+    飞行记录：后台持续读取JPEG帧，内存中只保留最近seconds秒，用例失败时才写成视频
+    帧数上限为seconds * fps，内存占用与用例的数量和时长无关
+    拉取式的帧源(每次迭代请求一次截图)按1/fps的节拍拉取，不占满设备的截图服务；
+    推送式的帧源(如mjpeg流)需要持续读取，按1/fps丢弃多余的帧
+    """
+
+    def __init__(self, frames, seconds: float = None, fps: int = None, pull: bool = False):
+        """
+        :param frames: 返回JPEG帧迭代器的函数
+        :param seconds: 保留的时长(s)，默认AppConfig.FLIGHT_SECONDS
+        :param fps: 保留的帧率，默认AppConfig.FLIGHT_FPS
+        :param pull: 帧源是否为拉取式
+        """
+        self._frames = frames
+        self._pull = pull
+        self.seconds = seconds or AppConfig.FLIGHT_SECONDS
+        self.fps = fps or AppConfig.FLIGHT_FPS
+        self._ring = collections.deque(maxlen=int(self.seconds * self.fps))
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def start(self):
+        if self._running:
+            return self
+        self._running = True
+        self._thread = threading.Thread(name="flight-recorder", target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(5.0)
+            self._thread = None
+
+    def _run(self):
+        interval = 1 / self.fps
+        last = 0
+        try:
+            frames = iter(self._frames())
+            while self._running:
+                if self._pull:
+                    # 等到下一个节拍再拉取，拉取到的帧全部保留
+                    delay = last + interval - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+                    last = time.time()
+                jpeg = next(frames, None)
+                if jpeg is None:
+                    break
+                timestamp = time.time()
+                if not self._pull:
+                    if timestamp - last < interval:
+                        continue
+                    last = timestamp
+                with self._lock:
+                    self._ring.append((timestamp, bytes(jpeg)))
+        except Exception as e:
+            log.warning(f"❗ Flight recorder stopped -> {e}.")
+        self._running = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ring.clear()
+
+    def save(self, output: str) -> Optional[str]:
+        """把缓存的帧写成视频(同时写入帧索引)，没有帧时返回None"""
+        with self._lock:
+            frames = list(self._ring)
+        if not frames:
+            return None
+        writer = ConstantRateWriter(output, fps=self.fps)
+        for timestamp, jpeg in frames:
+            writer.append(imageio.imread(io.BytesIO(jpeg)), timestamp)
+        writer.close()
+        log.info(f"📷️ Flight recorder: {len(frames)} frames -> ({output}).")
+        return output
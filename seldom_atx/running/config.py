@@ -15,6 +15,10 @@ class Seldom:
     device_id = None
     app_package = None
     env = None
+    # 页面快照：每个页面状态只dump一次hierarchy，元素定位在本地完成
+    snapshot = False
+    # 坐标缓存：相同页面相同定位的元素直接点击缓存的坐标，持久化在seldom_atx.db
+    coordinate_cache = False
 
 
 class BrowserConfig:
@@ -36,12 +40,37 @@ class AppConfig:
     PERF_RUN_FOLDER = None
     # 每个用例执行过程中呈现在报告上的图片
     REPORT_IMAGE = []
+    # 报告上使用原图的base64，默认只使用缩略图
+    REPORT_IMAGE_BASE64 = False
+    # 报告上缩略图的最大边长(px)
+    REPORT_THUMBNAIL = 320
+    # 截图保存的格式：png | jpg | webp，及jpg/webp的质量
+    SCREENSHOT_FORMAT = 'png'
+    SCREENSHOT_QUALITY = 85
+    # 后台保存截图的线程数
+    SCREENSHOT_WORKERS = 2
     # 默认设定录屏的帧率为45
     FPS = 45
     # 默认设定录屏分帧只分帧前后5s的片段
     FRAME_SECONDS = 5
     # 默认全局的耗时重复次数
     DURATION_TIMES = 3
+    # 耗时分析的进程数，每次执行的录屏结束后交给进程池分析(需要fork，不支持fork时在当前进程中分析)，0为在当前进程中依次分析
+    ANALYSIS_WORKERS = min(2, os.cpu_count() or 1)
+    # iOS录屏直通模式：只保存原始JPEG和到达时间，编码在后台线程完成
+    RECORD_PASSTHROUGH = False
+    # Android录屏方式：minicap uiautomator2截图录屏; screenrecord 设备端硬件编码
+    RECORD_BACKEND = 'minicap'
+    # Android设备端录屏每段的时长(s)，screenrecord单次最长180s
+    RECORD_CHUNK_SECONDS = 180
+    # Android截图对比时设备端的缩放比例(0, 1)，None为原始分辨率
+    COMPARE_SCALE = None
+    # 飞行记录：内存中保留最近FLIGHT_SECONDS秒的屏幕帧，用例失败时保存为视频
+    FLIGHT_RECORDER = False
+    FLIGHT_SECONDS = 10
+    FLIGHT_FPS = 10
+    # Android飞行记录的设备端缩放比例
+    FLIGHT_SCALE = 0.5
 
 
 class AppDecorator:
@@ -93,6 +122,13 @@ class DataBase:
     ELE_VALUE = 'value'
     ELE_PAGE = 'page'
 
+    COORD_TABLE = 'coordinate'
+    COORD_PACKAGE = 'package'
+    COORD_ACTIVITY = 'activity'
+    COORD_FINGERPRINT = 'fingerprint'
+    COORD_LOCATOR = 'locator'
+    COORD_BOUNDS = 'bounds'
+
     PERF_TABLE = 'perf'
     PERF_TIME = 'time'
     PERF_Device = 'device'
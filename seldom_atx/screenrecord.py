@@ -0,0 +1,38 @@
+"""
+seldom_atx android screenrecord
+uiautomator2的录屏依赖websocket-client(uiautomator2[image])，使用时再导入
+"""
+import time
+import imageio
+from uiautomator2.screenrecord import Screenrecord
+from seldom_atx.recording import FrameIndexWriter
+
+__all__ = ["TimedScreenrecord"]
+
+
+class TimedScreenrecord(Screenrecord):
+    """
+    uiautomator2的录屏，同时写入帧索引：每一帧记录minicap画面到达的时间
+    与原实现一样按时间补帧到固定帧率，每个原始帧只解码一次
+    """
+
+    def _run(self):
+        findex = 0
+        fstart = time.time()
+        shape = None
+        with imageio.get_writer(self._filename, fps=self._fps) as wr, FrameIndexWriter(self._filename) as index:
+            for raw in self._iter_minicap():
+                timestamp = time.time()
+                fcount = int((timestamp - fstart) * self._fps)
+                if fcount <= findex:
+                    continue
+                im = imageio.imread(raw)
+                if shape is None:
+                    shape = im.shape
+                elif im.shape != shape:
+                    im = self._resize_to(im, shape[:2])
+                for _ in range(fcount - findex):
+                    wr.append_data(im)
+                    index.append(timestamp)
+                findex = fcount
+        self._done_event.set()
@@ -0,0 +1,100 @@
+"""
+seldom_atx screenshot writer
+"""
+import io
+import os
+import base64
+from datetime import datetime
+from gevent.threadpool import ThreadPoolExecutor
+from PIL import Image, ImageDraw
+from seldom_atx.logging import log
+from seldom_atx.running.config import AppConfig
+
+__all__ = ["ScreenshotWriter"]
+
+# 文件后缀 -> PIL格式
+FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'webp': 'WEBP'}
+
+
+class ScreenshotWriter:
+    """
+    保存截图：未指定路径的截图在线程池中编码和写文件，调用方只生成报告用的缩略图
+    报告中默认只放标注了文件名的缩略图，原图保存在文件中；AppConfig.REPORT_IMAGE_BASE64 = True 时仍在报告中放原图的base64
+    """
+    pool = None
+    pending = []
+
+    @staticmethod
+    def default_path() -> str:
+        return os.path.join(AppConfig.PERF_RUN_FOLDER,
+                            f'{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.{AppConfig.SCREENSHOT_FORMAT}')
+
+    @staticmethod
+    def encode(image: Image.Image, file_path: str) -> bytes:
+        """按文件后缀编码，JPEG/WebP使用AppConfig.SCREENSHOT_QUALITY"""
+        ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+        fmt = FORMATS.get(ext, 'PNG')
+        buff = io.BytesIO()
+        if fmt == 'PNG':
+            image.save(buff, format=fmt)
+        else:
+            image.convert('RGB').save(buff, format=fmt, quality=AppConfig.SCREENSHOT_QUALITY)
+        return buff.getvalue()
+
+    @classmethod
+    def write(cls, image: Image.Image, file_path: str) -> str:
+        data = cls.encode(image, file_path)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        return file_path
+
+    @staticmethod
+    def thumbnail(image: Image.Image, file_path: str) -> str:
+        """报告用的JPEG缩略图base64，底部标注原图的文件名"""
+        thumb = image.convert('RGB')
+        thumb.thumbnail((AppConfig.REPORT_THUMBNAIL, AppConfig.REPORT_THUMBNAIL))
+        caption = Image.new('RGB', (thumb.width, thumb.height + 14), 'white')
+        caption.paste(thumb, (0, 0))
+        ImageDraw.Draw(caption).text((2, thumb.height + 2), os.path.basename(file_path), fill='black')
+        thumb = caption
+        buff = io.BytesIO()
+        thumb.save(buff, format='JPEG', quality=70)
+        return base64.b64encode(buff.getvalue()).decode("utf-8")
+
+    @classmethod
+    def save(cls, image: Image.Image, file_path: str = None, report: bool = False, sync: bool = None) -> str:
+        """
+        保存截图
+        :param image: PIL.Image
+        :param file_path: 默认保存到AppConfig.PERF_RUN_FOLDER
+        :param report: 是否添加到报告
+        :param sync: 是否等待写入完成，默认指定了file_path时等待，未指定时在后台写入
+        """
+        if sync is None:
+            sync = file_path is not None
+        if file_path is None:
+            file_path = cls.default_path()
+        log.info(f"📷️ screenshot -> ({file_path}).")
+        if report:
+            if AppConfig.REPORT_IMAGE_BASE64:
+                data = cls.encode(image, file_path)
+                AppConfig.REPORT_IMAGE.append(base64.b64encode(data).decode("utf-8"))
+            else:
+                AppConfig.REPORT_IMAGE.append(cls.thumbnail(image, file_path))
+                log.info(f"📷️ report image #{len(AppConfig.REPORT_IMAGE)} is a thumbnail, full size -> ({file_path}).")
+        if sync:
+            return cls.write(image, file_path)
+        if cls.pool is None:
+            cls.pool = ThreadPoolExecutor(max_workers=AppConfig.SCREENSHOT_WORKERS)
+        cls.pending.append(cls.pool.submit(cls.write, image, file_path))
+        return file_path
+
+    @classmethod
+    def flush(cls) -> None:
+        """等待所有截图写入完成"""
+        pending, cls.pending = cls.pending, []
+        for future in pending:
+            try:
+                future.result()
+            except Exception as e:
+                log.error(f"❌ Save screenshot error -> {e}.")
@@ -1,14 +1,22 @@
 import os
 import time
-import base64
-from typing import Tuple
+from typing import List, Optional, Tuple
 from datetime import datetime
+from PIL import Image
+from uiautomator2 import UiObject
+from uiautomator2.exceptions import UiObjectNotFoundError, XPathElementNotFoundError
 from seldom_atx.logging import log
 from seldom_atx.testdata import get_word
 from seldom_atx.running.config import Seldom, AppConfig, AppDecorator
 from seldom_atx.logging.exceptions import NotFindElementError
+from seldom_atx.hierarchy import Snapshot, SnapshotElement, mutating, VOLATILE_ATTRIBUTES
+from seldom_atx.polling import backoff
+from seldom_atx.coordinate import CoordinateCache
+from seldom_atx.recording import NativeScreenrecord, FlightRecorder
+from seldom_atx.capture import FrameSource, capture, iter_jpeg
+from seldom_atx.screenshot import ScreenshotWriter
 
-__all__ = ["U2Driver", "U2Element", "u2"]
+__all__ = ["U2Driver", "U2Element", "U2ElementHandle", "u2"]
 
 keycodes = {
     'home': 'home',
@@ -17,6 +25,19 @@ keycodes = {
     'enter': 'enter',
 }
 
+TEXT_CLASSES = ('android.widget.TextView', 'android.widget.Button')
+
+# UiScrollable支持的定位方式
+SCROLL_SELECTORS = {
+    'resourceId': 'resourceId',
+    'text': 'text',
+    'className': 'className',
+    'name': 'description',
+}
+
+# 元素已过期(页面变化后不再存在)时设备端抛出的异常
+STALE_ERRORS = (UiObjectNotFoundError, XPathElementNotFoundError)
+
 LOCATOR_LIST = {
     'resourceId': "resourceId",
     'name': "name",
@@ -48,23 +69,45 @@ class U2Element:
         else:
             self.desc = ', '.join([f"{k}={v}" for k, v in self.kwargs.items()])
 
+    def selector(self, index: int = None):
+        """设备端的元素对象"""
+        if index:
+            if 'xpath' in self.kwargs:
+                return Seldom.driver.xpath(**self.kwargs).all()[index]
+            return Seldom.driver(**self.kwargs)[index]
+        if 'xpath' in self.kwargs:
+            return Seldom.driver.xpath(**self.kwargs)
+        return Seldom.driver(**self.kwargs)
+
+    def wait_selector(self, index: int = None, timeout: float = None):
+        """
+        等待设备端的元素出现，超时时间只对本次调用生效，不修改全局的隐式等待
+        :param timeout: 超时时间，为0时只检查一次
+        """
+        if 'xpath' not in self.kwargs:
+            elem = self.selector(index)
+            if not elem.wait(timeout=timeout):
+                raise TimeoutError(f"not exist after {timeout}s")
+            return elem
+        xpath = Seldom.driver.xpath(**self.kwargs)
+        deadline = time.time() + timeout
+        for delay in backoff(start=0.2):
+            elems = xpath.all()
+            if len(elems) > (index or 0):
+                return elems[index] if index else xpath
+            if time.time() + delay > deadline:
+                raise TimeoutError(f"not exist after {timeout}s")
+            time.sleep(delay)
+
     def get_elements(self, index: int = None, empty: bool = False, timeout: float = None):
         """获取元素"""
+        if Seldom.snapshot:
+            return self.get_snapshot_elements(index=index, empty=empty, timeout=timeout)
         try:
-            if timeout:
-                u2.implicitly_wait(timeout=timeout, noLog=True)
-            if index:
-                if 'xpath' in self.kwargs:
-                    elems = Seldom.driver.xpath(**self.kwargs).all()[index]
-                else:
-                    elems = Seldom.driver(**self.kwargs)[index]
+            if timeout is None:
+                elems = self.selector(index)
             else:
-                if 'xpath' in self.kwargs:
-                    elems = Seldom.driver.xpath(**self.kwargs)
-                else:
-                    elems = Seldom.driver(**self.kwargs)
-            if timeout:
-                u2.implicitly_wait(timeout=Seldom.timeout, noLog=True)
+                elems = self.wait_selector(index, timeout)
         except Exception as e:
             if empty is False:
                 raise NotFindElementError(f"❌ Find error: {self.desc} -> {e}.")
@@ -73,6 +116,21 @@ class U2Element:
         self.find_elem_info = f"Find element: {self.desc}."
         return elems
 
+    def get_snapshot_elements(self, index: int = None, empty: bool = False, timeout: float = None):
+        """在页面快照中获取元素，快照中不存在时重新dump直到超时"""
+        try:
+            ids = Snapshot.resolve(index=index or 0, timeout=timeout, **self.kwargs)
+        except Exception as e:
+            if empty is False:
+                raise NotFindElementError(f"❌ Find error: {self.desc} -> {e}.")
+            return []
+        if not ids:
+            if empty is False:
+                raise NotFindElementError(f"❌ Find error: {self.desc} -> not exist in snapshot.")
+            return []
+        self.find_elem_info = f"Find element: {self.desc}."
+        return SnapshotElement(Snapshot.tree, ids, self, index or 0)
+
     @property
     def info(self):
         """return element info"""
@@ -84,8 +142,133 @@ class U2Element:
         return self.find_elem_warn
 
 
+class U2ElementHandle:
+    """
+    已定位的元素句柄：只定位一次，缓存bounds和设备端的selector，支持链式操作
+    只有操作返回元素已过期时才重新定位
+
+    Usage:
+    u2.element(resourceId='com.app:id/username').click().clear().type('seldom')
+    """
+
+    def __init__(self, index: int = None, **kwargs) -> None:
+        self.u2_elem = U2Element(**kwargs)
+        self.desc = self.u2_elem.desc
+        self.index = index
+        self.elem = None
+        self.bounds = None
+
+    def resolve(self, timeout: float = None):
+        """定位元素，缓存bounds和设备端的selector"""
+        if timeout is None:
+            timeout = Seldom.timeout
+        elem = self.u2_elem.get_elements(index=self.index, timeout=timeout)
+        try:
+            if isinstance(elem, SnapshotElement):
+                self.bounds = elem.bounds()
+                elem = elem.selector
+            elif isinstance(elem, UiObject):
+                self.bounds = elem.bounds()
+            elif hasattr(elem, 'get_last_match'):
+                # XPathSelector, 复用等待时dump的页面
+                self.bounds = elem.get_last_match().bounds
+            else:
+                # XMLElement
+                self.bounds = elem.bounds
+        except STALE_ERRORS as e:
+            raise NotFindElementError(f"❌ Find error: {self.desc} -> {e}.")
+        self.elem = elem
+        return self
+
+    def resolve_in(self, tree):
+        """在页面快照中定位，不请求设备"""
+        i = tree.nth(self.index or 0, **self.u2_elem.kwargs)
+        if i is None:
+            raise NotFindElementError(f"❌ Find error: {self.desc} -> not exist in snapshot.")
+        self.bounds = tree.bounds(i)
+        self.elem = self.u2_elem.selector(self.index)
+        return self
+
+    def _perform(self, action):
+        """执行设备端操作，元素过期时重新定位并重试一次"""
+        if self.elem is None:
+            self.resolve()
+        try:
+            return action(self.elem)
+        except STALE_ERRORS:
+            log.info(f"⌛ {self.desc} -> stale element, resolve again.")
+            self.resolve()
+            return action(self.elem)
+
+    def center(self) -> Tuple[int, int]:
+        """元素中心坐标"""
+        if self.bounds is None:
+            self.resolve()
+        lx, ly, rx, ry = self.bounds
+        return (lx + rx) // 2, (ly + ry) // 2
+
+    @mutating
+    def click(self):
+        """点击缓存的元素中心坐标"""
+        Seldom.driver.click(*self.center())
+        log.info(f"✅ {self.desc} -> click.")
+        return self
+
+    @mutating
+    def clear(self):
+        """清空元素文本"""
+
+        def action(elem):
+            if isinstance(elem, UiObject):
+                elem.jsonrpc.clearTextField(elem.selector)
+            else:
+                Seldom.driver.click(*self.center())
+                Seldom.driver.clear_text()
+
+        self._perform(action)
+        log.info(f"✅ {self.desc} -> clear input.")
+        return self
+
+    @mutating
+    def type(self, text: str, enter: bool = False):
+        """输入元素文本"""
+
+        def action(elem):
+            if isinstance(elem, UiObject):
+                elem.jsonrpc.setText(elem.selector, text)
+            else:
+                Seldom.driver.click(*self.center())
+                Seldom.driver.send_keys(text)
+
+        self._perform(action)
+        log.info(f"✅ {self.desc} -> input [{text}].")
+        if enter is True:
+            Seldom.driver.press(keycodes.get('enter'))
+        return self
+
+    def get_text(self) -> str:
+        """获取元素文本"""
+
+        def action(elem):
+            if isinstance(elem, UiObject):
+                return elem.jsonrpc.getText(elem.selector)
+            return elem.get_text() if hasattr(elem, 'get_text') else elem.text
+
+        text = self._perform(action)
+        log.info(f"✅ {self.desc} -> text: {text}.")
+        return text
+
+
 class U2Driver:
     """Android驱动"""
+    # 当前的录屏(NativeScreenrecord/TimedScreenrecord)，同时写入帧索引xxx.mp4.idx
+    screenrecord = None
+    # 持续获取屏幕帧，启动后save_screenshot使用最新一帧
+    frame_source = None
+    # 飞行记录，用例失败时保存最近的屏幕帧
+    flight_recorder = None
+    # 最近一次wait_stable的页面稳定耗时(s)
+    settle_time = None
 
     @staticmethod
     def implicitly_wait(timeout: float = None, noLog: bool = False) -> None:
@@ -98,6 +281,7 @@ class U2Driver:
             log.info(f'✅ Set implicitly wait -> {timeout}s.')
 
     @staticmethod
+    @mutating
     def install_app(app_path: str) -> None:
         """安装指定应用"""
 
@@ -105,6 +289,7 @@ class U2Driver:
         log.info(f'✅ {app_path} -> Install APP.')
 
     @staticmethod
+    @mutating
     def remove_app(package_name: str = None) -> None:
         """卸载指定应用"""
 
@@ -114,6 +299,7 @@ class U2Driver:
         log.info(f'✅ {package_name} -> Remove APP.')
 
     @staticmethod
+    @mutating
     def launch_app(package_name: str = None, stop: bool = False) -> None:
         """启动指定应用"""
 
@@ -123,6 +309,7 @@ class U2Driver:
         Seldom.driver.app_start(package_name=package_name, stop=stop)
 
     @staticmethod
+    @mutating
     def close_app(package_name: str = None) -> None:
         """关闭指定应用"""
         if not package_name:
@@ -131,12 +318,14 @@ class U2Driver:
         Seldom.driver.app_stop(package_name)
 
     @staticmethod
+    @mutating
     def close_app_all() -> None:
         """关闭所有应用"""
         Seldom.driver.app_stop_all()
         log.info('✅ Close all APP.')
 
     @staticmethod
+    @mutating
     def clear_app(package_name: str = None) -> None:
         """清除APP数据"""
         if not package_name:
@@ -153,22 +342,30 @@ class U2Driver:
         pid = Seldom.driver.app_wait(package_name)
         return pid
 
+    @staticmethod
+    def element(index: int = None, timeout: float = None, **kwargs) -> U2ElementHandle:
+        """
+        获取已定位的元素句柄，后续操作不再重复定位
+
+        Usage:
+        u2.element(text='Login').click()
+        u2.element(resourceId='com.app:id/username').clear().type('seldom', enter=True)
+        """
+        return U2ElementHandle(index=index, **kwargs).resolve(timeout=timeout)
+
     def set_text(self, text: str, clear: bool = False, enter: bool = False, click: bool = False, index: int = None,
                  **kwargs) -> None:
         """输入元素文本"""
+        handle = self.element(index=index, **kwargs)
         if clear is True:
-            self.clear_text(index, **kwargs)
+            handle.clear()
         if click is True:
-            self.click(index, **kwargs)
+            handle.click()
             time.sleep(0.5)
-        u2_elem = U2Element(**kwargs)
-        elem = u2_elem.get_elements(index=index)
-        log.info(f"✅ {u2_elem.info} -> input [{text}].")
-        elem.set_text(text)
-        if enter is True:
-            elem.press('enter')
+        handle.type(text, enter=enter)
 
     @staticmethod
+    @mutating
     def clear_text(index: int = None, **kwargs) -> None:
         """清空元素文本"""
         u2_elem = U2Element(**kwargs)
@@ -177,18 +374,30 @@ class U2Driver:
         elem.clear_text()
 
     @staticmethod
+    @mutating
     def click(index: int = None, **kwargs) -> None:
         """点击元素"""
         u2_elem = U2Element(**kwargs)
+        if Seldom.coordinate_cache and CoordinateCache.click(index, **u2_elem.kwargs):
+            log.info(f"✅ {u2_elem.desc} -> click cached coordinate.")
+            return
         elem = u2_elem.get_elements(index=index)
+        if Seldom.coordinate_cache:
+            CoordinateCache.record(index, **u2_elem.kwargs)
         elem.click()
         log.info(f"✅ {u2_elem.info} -> click.")
 
     @staticmethod
+    @mutating
     def click_text(text: str, index: int = None) -> None:
         """点击文本元素"""
         u2_elem = U2Element(text=text)
+        if Seldom.coordinate_cache and CoordinateCache.click(index, **u2_elem.kwargs):
+            log.info(f"✅ {u2_elem.desc} -> click cached coordinate.")
+            return
         elem = u2_elem.get_elements(index=index)
+        if Seldom.coordinate_cache:
+            CoordinateCache.record(index, **u2_elem.kwargs)
         elem.click()
         log.info(f"✅ {u2_elem.info} -> click text.")
 
@@ -201,18 +410,38 @@ class U2Driver:
         log.info(f"✅ {u2_elem.info} -> text: {text}.")
         return text
 
-    def get_text_page(self, stable=False):
+    def iter_text_page(self, classes: tuple = TEXT_CLASSES, stable: bool = False, unique: bool = False):
         """
-        获取页面所有元素的文本内容
+        逐个返回页面文本及其bounds，整个页面只dump一次
+        :param classes: 只获取这些className的元素，为空时获取所有有文本的元素
+        :param stable: 是否先等待页面稳定
+        :param unique: 是否去掉重复的文本
         """
         if stable:
             self.wait_stable()
+        tree = Snapshot.current() if stable or Seldom.snapshot else Snapshot.refresh()
+        seen = set()
+        for text, bounds in tree.texts(classes):
+            if unique:
+                if text in seen:
+                    continue
+                seen.add(text)
+            yield text, bounds
+
+    def get_text_page(self, stable: bool = False, classes: tuple = TEXT_CLASSES, bounds: bool = False,
+                      unique: bool = False):
+        """
+        获取页面所有元素的文本内容
+        :param stable: 是否先等待页面稳定
+        :param classes: 只获取这些className的元素，为空时获取所有有文本的元素
+        :param bounds: 是否同时返回元素的bounds: [(text, (lx, ly, rx, ry)), ...]
+        :param unique: 是否去掉重复的文本
+        """
         try:
-            texts = []
-            for i in Seldom.driver.xpath('//android.widget.TextView|//android.widget.Button').all():
-                texts.append(i.text.strip())
+            items = list(self.iter_text_page(classes=classes, stable=stable, unique=unique))
+            texts = [text for text, _ in items]
             log.info(f"✅ All text on the current page -> {texts}.")
-            return texts
+            return items if bounds else texts
         except Exception as err:
             return err
 
@@ -220,38 +449,131 @@ class U2Driver:
     def get_display(index: int = None, timeout: float = 1.0, **kwargs) -> bool:
         """获取元素可见状态"""
         u2_elem = U2Element(**kwargs)
-        elem = u2_elem.get_elements(index=index, empty=True, timeout=timeout)
-        if not elem:
-            return False
-        else:
-            result = elem.exists
-            log.info(f"✅ {u2_elem.desc} -> display: {result}.")
-            return result
+        # 超时未出现时get_elements返回[]
+        result = u2_elem.get_elements(index=index, empty=True, timeout=timeout) != []
+        log.info(f"✅ {u2_elem.desc} -> display: {result}.")
+        return result
+
+    @staticmethod
+    def exists_now(index: int = None, **kwargs) -> bool:
+        """
+        立即判断元素是否存在：只检查当前页面快照，不等待
+
+        Usage:
+        self.exists_now(text='升级提示')
+        """
+        u2_elem = U2Element(**kwargs)
+        tree = Snapshot.current() if Seldom.snapshot else Snapshot.refresh()
+        result = tree.nth(index or 0, **u2_elem.kwargs) is not None
+        log.info(f"✅ {u2_elem.desc} -> exists now: {result}.")
+        return result
+
+    @staticmethod
+    def absent_for(duration: float, index: int = None, **kwargs) -> bool:
+        """
+        元素在duration秒内一直不存在，出现时立即返回False
+        :param duration: 持续时间(s)
+
+        Usage:
+        self.absent_for(2, text='加载失败')
+        """
+        u2_elem = U2Element(**kwargs)
+        log.info(f"⌛ {u2_elem.desc} -> keep absent: {duration}s.")
+        deadline = time.time() + duration
+        for delay in backoff():
+            if Snapshot.refresh().nth(index or 0, **u2_elem.kwargs) is not None:
+                log.warning(f"❌ {u2_elem.desc} -> exist.")
+                return False
+            if time.time() >= deadline:
+                return True
+            time.sleep(min(delay, max(deadline - time.time(), 0)))
 
     def wait(self, timeout: int = Seldom.timeout, index: int = None, noLog: bool = False, **kwargs) -> bool:
         """等待元素出现"""
         u2_elem = U2Element(**kwargs)
-        timeout_backups = Seldom.timeout
-        Seldom.timeout = timeout
         if noLog is not True:
             log.info(f"⌛ {u2_elem.desc} -> wait element: {timeout}s.")
-        try:
-            u2_elem.get_elements(empty=kwargs.get('empty', False), index=index).wait(timeout=timeout)
-            result = True
-        except:
+        # 超时时间只对本次调用生效，不修改Seldom.timeout
+        result = u2_elem.get_elements(index=index, empty=True, timeout=timeout) != []
+        if not result:
             if noLog is False:
                 log.warning(f"❌ {u2_elem.desc} -> not exist.")
             self.save_screenshot(report=True)
-            result = False
-        Seldom.timeout = timeout_backups
         return result
 
+    def wait_any(self, locators: List[dict], timeout: float = None,
+                 noLog: bool = False) -> Tuple[int, Optional[U2ElementHandle]]:
+        """
+        等待多个元素中的任意一个出现，每轮只dump一次页面，所有定位方式在同一个快照中判断
+        :param locators: 定位方式列表，可带index
+        :param timeout: 超时时间，默认Seldom.timeout
+        :return: (出现的定位方式的下标, 元素句柄)，超时返回(-1, None)
+
+        Usage:
+        n, elem = self.wait_any([{'text': '登录成功'}, {'resourceId': 'com.app:id/error'}], timeout=10)
+        """
+        if timeout is None:
+            timeout = Seldom.timeout
+        u2_elems = [U2Element(**locator) for locator in locators]
+        queries = [{**elem.kwargs, 'index': getattr(elem, 'index', None)} for elem in u2_elems]
+        desc = ' | '.join(elem.desc for elem in u2_elems)
+        if noLog is not True:
+            log.info(f"⌛ {desc} -> wait any element: {timeout}s.")
+        deadline = time.time() + timeout
+        for delay in backoff():
+            tree = Snapshot.refresh()
+            n, _ = tree.find_any(queries)
+            if n != -1:
+                handle = U2ElementHandle(index=queries[n]['index'], **u2_elems[n].kwargs).resolve_in(tree)
+                log.info(f"✅ {u2_elems[n].desc} -> exist.")
+                return n, handle
+            if time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+        if noLog is not True:
+            log.warning(f"❌ {desc} -> none exist.")
+        self.save_screenshot(report=True)
+        return -1, None
+
+    def wait_all(self, locators: List[dict], timeout: float = None, noLog: bool = False) -> List[U2ElementHandle]:
+        """
+        等待多个元素全部出现在同一个页面快照中，每轮只dump一次页面
+        :param locators: 定位方式列表，可带index
+        :param timeout: 超时时间，默认Seldom.timeout
+        :return: 与locators一一对应的元素句柄，超时返回[]
+        """
+        if timeout is None:
+            timeout = Seldom.timeout
+        u2_elems = [U2Element(**locator) for locator in locators]
+        queries = [{**elem.kwargs, 'index': getattr(elem, 'index', None)} for elem in u2_elems]
+        desc = ' & '.join(elem.desc for elem in u2_elems)
+        if noLog is not True:
+            log.info(f"⌛ {desc} -> wait all elements: {timeout}s.")
+        deadline = time.time() + timeout
+        for delay in backoff():
+            tree = Snapshot.refresh()
+            if all(tree.find_any([query])[0] == 0 for query in queries):
+                log.info(f"✅ {desc} -> all exist.")
+                return [U2ElementHandle(index=query['index'], **elem.kwargs).resolve_in(tree)
+                        for elem, query in zip(u2_elems, queries)]
+            if time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+        if noLog is not True:
+            log.warning(f"❌ {desc} -> not all exist.")
+        self.save_screenshot(report=True)
+        return []
+
     def wait_gone(self, timeout: int = None, index: int = None, **kwargs) -> bool:
         """等待元素消失"""
         if not timeout:
             timeout = Seldom.timeout
         u2_elem = U2Element(**kwargs)
-        elem = u2_elem.get_elements(empty=kwargs.get('empty', False), index=index)
+        if Seldom.snapshot:
+            # 快照会等待元素出现，已经消失的元素直接使用设备端的元素对象
+            elem = u2_elem.selector(index)
+        else:
+            elem = u2_elem.get_elements(empty=kwargs.get('empty', False), index=index)
         log.info(f"⌛ {u2_elem.desc} -> wait gone: {timeout}s.")
         result = elem.wait_gone(timeout=timeout)
         if not result:
@@ -259,54 +581,150 @@ class U2Driver:
             self.save_screenshot(report=True)
         return result
 
-    def wait_stable(self, interval: float = 1.0, retry: int = 10, timeout: float = 20.0) -> bool:
-        """等待页面稳定"""
-        deadline = time.time() + timeout
-        while time.time() < deadline:
-            for _ in range(retry):
-                first_snapshot = Seldom.driver.dump_hierarchy()
-                time.sleep(interval)
-                second_snapshot = Seldom.driver.dump_hierarchy()
-                if first_snapshot == second_snapshot:
-                    return True
-                else:
+    def wait_stable(self, interval: float = 1.0, retry: int = None, timeout: float = 20.0, times: int = 2,
+                    volatile: tuple = None, exclude: list = None) -> bool:
+        """
+        等待页面稳定：归一化后的页面指纹至少interval秒内保持不变，且连续times次一致
+        页面变化时从50ms开始重新退避轮询，尽快发现下一次变化；稳定耗时记录在U2Driver.settle_time
+        :param interval: 页面保持不变的最短时间，也是轮询的最大间隔
+        :param retry: 已废弃，等待时长由timeout决定
+        :param timeout: 超时时间
+        :param times: 连续一致的次数
+        :param volatile: 忽略的易变属性，默认hierarchy.VOLATILE_ATTRIBUTES
+        :param exclude: 忽略的易变子树(定位方式列表)，默认hierarchy.VOLATILE_SUBTREES
+        """
+        if retry is not None:
+            log.warning('❗ wait_stable(retry=...) is deprecated, the wait is bounded by timeout.')
+        if volatile is None:
+            volatile = VOLATILE_ATTRIBUTES
+        start_time = time.time()
+        deadline = start_time + timeout
+        last_fingerprint = None
+        same_times = 0
+        settled_time = start_time
+        delays = backoff(maximum=interval)
+        while True:
+            polled_time = time.time()
+            fingerprint = Snapshot.refresh().fingerprint(volatile=volatile, exclude=exclude)
+            if fingerprint == last_fingerprint:
+                same_times += 1
+            else:
+                if last_fingerprint is not None:
                     log.info('⌛ Wait page stable...')
+                last_fingerprint = fingerprint
+                same_times = 1
+                settled_time = polled_time
+                delays = backoff(maximum=interval)
+            quiet = polled_time - settled_time
+            if same_times >= times and quiet >= interval:
+                U2Driver.settle_time = round(settled_time - start_time, 3)
+                log.info(f'✅ Page stable -> settle: {U2Driver.settle_time}s.')
+                return True
+            # 不超过静默窗口的剩余时间，窗口结束时立即确认
+            delay = next(delays)
+            if quiet < interval:
+                delay = min(delay, interval - quiet)
+            if time.time() + delay > deadline:
+                break
+            time.sleep(delay)
         self.save_screenshot(report=True)
         raise EnvironmentError("❌ Unstable page.")
 
     @staticmethod
-    def start_recording(output: str = None, fps: int = None) -> None:
-        """开始录屏"""
+    def start_recording(output: str = None, fps: int = None, backend: str = None) -> None:
+        """
+        开始录屏
+        :param output: 视频保存路径
+        :param fps: 视频帧率，默认AppConfig.FPS
+        :param backend: minicap | screenrecord，默认AppConfig.RECORD_BACKEND
+        """
         if output is None:
             log.warning('Please set the storage location for screen recording')
             output = 'record.mp4'
         if fps is None:
             fps = AppConfig.FPS
-        log.info(f"📷️ start_recording -> ({output}).")
-        Seldom.driver.screenrecord(output, fps=fps)
+        backend = backend or AppConfig.RECORD_BACKEND
+        log.info(f"📷️ start_recording({backend}) -> ({output}).")
+        if backend == 'screenrecord':
+            U2Driver.screenrecord = NativeScreenrecord(Seldom.driver)(output, fps=fps)
+        elif backend == 'minicap':
+            from seldom_atx.screenrecord import TimedScreenrecord
+            U2Driver.screenrecord = TimedScreenrecord(Seldom.driver)(output, fps=fps)
+        else:
+            raise ValueError(f"Unsupported record backend: {backend}")
 
     @staticmethod
     def stop_recording() -> None:
         """结束录屏"""
         log.info(f"📷️ record down.")
-        Seldom.driver.screenrecord.stop()
+        U2Driver.screenrecord.stop()
 
     @staticmethod
-    def save_screenshot(file_path: str = None, report: bool = False) -> None:
-        """保存截图"""
-        screenshot = Seldom.driver.screenshot()
-        if file_path is None:
-            file_path = os.path.join(AppConfig.PERF_RUN_FOLDER,
-                                     f'{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.png')
+    def start_flight_recorder(seconds: float = None, fps: int = None) -> FlightRecorder:
+        """
+        开始飞行记录：内存中只保留最近的屏幕帧，用例失败时保存为视频
+        :param seconds: 保留的时长(s)，默认AppConfig.FLIGHT_SECONDS
+        :param fps: 保留的帧率，默认AppConfig.FLIGHT_FPS
+        """
+        if U2Driver.flight_recorder is None or not U2Driver.flight_recorder.running:
+            log.info("📷️ start flight recorder.")
+            U2Driver.flight_recorder = FlightRecorder(lambda: iter_jpeg(AppConfig.FLIGHT_SCALE),
+                                                      seconds=seconds, fps=fps, pull=True).start()
+        return U2Driver.flight_recorder
+
+    @staticmethod
+    def stop_flight_recorder() -> None:
+        """结束飞行记录"""
+        if U2Driver.flight_recorder is not None:
+            U2Driver.flight_recorder.stop()
+            U2Driver.flight_recorder = None
+
+    @staticmethod
+    def start_frame_source(interval: float = 0.5) -> FrameSource:
+        """
+        开始持续获取屏幕帧(原始screencap)，之后的截图直接使用最近一次操作之后的最新一帧
+        :param interval: 两次开始获取之间的最小间隔(s)
+        """
+        if U2Driver.frame_source is None or not U2Driver.frame_source.running:
+            log.info("📷️ start frame source.")
+            U2Driver.frame_source = FrameSource(interval=interval).start()
+        return U2Driver.frame_source
+
+    @staticmethod
+    def stop_frame_source() -> None:
+        """结束持续获取屏幕帧"""
+        if U2Driver.frame_source is not None:
+            U2Driver.frame_source.stop()
+            U2Driver.frame_source = None
+
+    @staticmethod
+    def screenshot() -> Image.Image:
+        """截图，启动了frame source时使用最近一次操作之后的最新一帧"""
+        if U2Driver.frame_source is not None and U2Driver.frame_source.running:
+            return Image.fromarray(U2Driver.frame_source.latest(since=Snapshot.changed))
+        return Seldom.driver.screenshot()
+
+    @staticmethod
+    def capture(region: tuple = None, scale: float = None, file_path: str = None):
+        """
+        截图为RGB的NumPy数组，用于图像对比
+        :param region: 裁剪区域(lx, ly, rx, ry)
+        :param scale: 设备端缩放比例(0, 1)
+        :param file_path: 同时保存到文件，默认不保存
+        """
+        if file_path:
+            log.info(f"📷️ capture -> ({file_path}).")
+        return capture(region=region, scale=scale, path=file_path)
 
-        log.info(f"📷️ screenshot -> ({file_path}).")
-        screenshot.save(file_path)
-        if report:
-            with open(file_path, "rb") as image_file:
-                image_bytes = image_file.read()
-                base64_data = base64.b64encode(image_bytes)
-                base64_string = base64_data.decode("utf-8")
-            AppConfig.REPORT_IMAGE.extend([base64_string])
+    @staticmethod
+    def save_screenshot(file_path: str = None, report: bool = False, sync: bool = None) -> None:
+        """
+        保存截图
+        :param file_path: 默认保存到AppConfig.PERF_RUN_FOLDER，格式为AppConfig.SCREENSHOT_FORMAT
+        :param report: 是否添加到报告(缩略图)
+        :param sync: 是否等待写入完成，默认指定了file_path时等待，未指定时在后台写入
+        """
+        ScreenshotWriter.save(U2Driver.screenshot(), file_path, report=report, sync=sync)
 
     @staticmethod
     def write_log(save_path: str = None) -> None:
@@ -340,6 +758,7 @@ class U2Driver:
             raise Exception(f'❌ Error in write_log: {e}.')
 
     @staticmethod
+    @mutating
     def open_quick_settings():
         """
         打开状态栏快速设置
@@ -367,6 +786,7 @@ class U2Driver:
         return elem
 
     @staticmethod
+    @mutating
     def press(key: str) -> None:
         """按下key"""
         log.info(f'✅ Press key -> "{key}".')
@@ -374,12 +794,14 @@ class U2Driver:
         Seldom.driver.press(keycode)
 
     @staticmethod
+    @mutating
     def back() -> None:
         """按下物理返回键"""
         log.info("✅ Go back.")
         Seldom.driver.press(keycodes.get('back'))
 
     @staticmethod
+    @mutating
     def home() -> None:
         """按下物理home键"""
         log.info("✅ Press home.")
@@ -393,12 +815,14 @@ class U2Driver:
         return size
 
     @staticmethod
+    @mutating
     def tap(x: int, y: int) -> None:
         """按下坐标点"""
         log.info(f"✅ tap x={x},y={y}.")
         Seldom.driver.click(x=x, y=y)
 
     @staticmethod
+    @mutating
     def swipe_up(times: int = 1, upper: bool = False, width: float = 0.5, start: float = 0.9,
                  end: float = 0.1) -> None:
         """向上滑动"""
@@ -412,25 +836,85 @@ class U2Driver:
             if times != 1:
                 time.sleep(1)
 
-    def swipe_up_find(self, times: int = 15, upper: bool = False, index: int = None, **kwargs) -> None:
+    def swipe_up_find(self, times: int = 15, upper: bool = False, index: int = None, **kwargs) -> Optional[int]:
         """
-        向上滑动寻找元素
+        向上滑动寻找元素，返回本地滑动的次数，见scroll_to
 
         Usage:
         self.swipe_up_find(elem=ElemObj)
         self.swipe_up_find(text='login')
         """
 
-        swipe_times = 0
-        u2_elem = U2Element(index=index, **kwargs)
-        log.info(f'✅ {u2_elem.desc} -> swipe to find.')
-        while not self.get_display(**kwargs):
-            self.swipe_up(upper=upper)
-            swipe_times += 1
-            if swipe_times > times:
-                raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {u2_elem.desc}.")
+        return self.scroll_to(direction='up', times=times, upper=upper, index=index, **kwargs)
+
+    def scroll_to(self, direction: str = 'up', times: int = 15, upper: bool = False, index: int = None,
+                  **kwargs) -> Optional[int]:
+        """
+        滑动直到元素出现：优先使用UiScrollable在设备端滚动，不支持时在本地循环滑动，
+        滑动后页面指纹不变则认为已经滑到底，不再继续滑动
+        :param direction: 滑动方向 up/down/left/right
+        :param times: 本地最多滑动次数，UiScrollable使用设备端自己的最大滑动次数
+        :param upper: 只在屏幕上半部分滑动
+        :param index: 第几个匹配的元素
+        :return: 本地滑动的次数，已经可见时为0；由UiScrollable滚动时滑动次数未知，返回None
+
+        Usage:
+        self.scroll_to(text='login')
+        self.scroll_to(direction='left', height=0.5, resourceId='com.app:id/tab')
+        """
+        swipe_kwargs = {'upper': upper}
+        if 'height' in kwargs:
+            swipe_kwargs['height'] = kwargs.pop('height')
+        swipe = {'up': self.swipe_up, 'down': self.swipe_down,
+                 'left': self.swipe_left, 'right': self.swipe_right}.get(direction)
+        if swipe is None:
+            raise ValueError(f"Invalid direction: {direction}.")
+        u2_elem = U2Element(**kwargs)
+        log.info(f'✅ {u2_elem.desc} -> scroll {direction} to find.')
+        tree = Snapshot.refresh()
+        if self._in_tree(tree, index, u2_elem.kwargs):
+            return 0
+        if self._scroll_into_view(direction, index, u2_elem.kwargs):
+            log.info(f'✅ {u2_elem.desc} -> scrolled into view by UiScrollable.')
+            return None
+        last_fingerprint = tree.fingerprint()
+        for swipe_times in range(1, times + 1):
+            swipe(**swipe_kwargs)
+            tree = Snapshot.refresh()
+            if self._in_tree(tree, index, u2_elem.kwargs):
+                log.info(f'✅ {u2_elem.desc} -> found after {swipe_times} swipes.')
+                return swipe_times
+            fingerprint = tree.fingerprint()
+            if fingerprint == last_fingerprint:
+                raise NotFindElementError(
+                    f"❌ Find element error: reach the end after {swipe_times} swipes, no find -> {u2_elem.desc}.")
+            last_fingerprint = fingerprint
+        raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {u2_elem.desc}.")
+
+    @staticmethod
+    def _in_tree(tree, index: int, kwargs: dict) -> bool:
+        """元素是否在快照中，快照不支持的定位方式交给设备端判断"""
+        if tree.supports(**kwargs):
+            return tree.nth(index or 0, **kwargs) is not None
+        return U2Element(**kwargs).selector(index).exists
+
+    @staticmethod
+    @mutating
+    def _scroll_into_view(direction: str, index: int, kwargs: dict) -> bool:
+        """使用UiScrollable在设备端滚动到元素，没有可滚动的容器或定位方式不支持时返回False"""
+        if index or not all(by in SCROLL_SELECTORS for by in kwargs):
+            return False
+        selector = {SCROLL_SELECTORS[by]: value for by, value in kwargs.items()}
+        scroll = Seldom.driver(scrollable=True).scroll
+        if direction in ('left', 'right'):
+            scroll = scroll.horiz
+        try:
+            return bool(scroll.to(**selector))
+        except STALE_ERRORS:
+            return False
 
     @staticmethod
+    @mutating
     def swipe_down(times: int = 1, upper: bool = False, width: float = 0.5, start: float = 0.1,
                    end: float = 0.9) -> None:
         """swipe down"""
@@ -445,6 +929,7 @@ class U2Driver:
                 time.sleep(1)
 
     @staticmethod
+    @mutating
     def swipe_left(times: int = 1, upper: bool = False, height: float = 0.9, start: float = 0.9,
                    end: float = 0.1) -> None:
         """swipe left"""
@@ -459,24 +944,18 @@ class U2Driver:
                 time.sleep(1)
 
     def swipe_left_find(self, times: int = 15, upper: bool = False, height: float = 0.9, index: int = None,
-                        **kwargs) -> None:
+                        **kwargs) -> Optional[int]:
         """
-        向左滑动寻找元素
+        向左滑动寻找元素，返回本地滑动的次数，见scroll_to
 
         Usage:
         self.swipe_left_find(text='login')
         """
 
-        swipe_times = 0
-        u2_elem = U2Element(index=index, **kwargs)
-        log.info(f'✅ {u2_elem.desc} -> swipe to find.')
-        while not self.get_display(**kwargs):
-            self.swipe_left(upper=upper, height=height)
-            swipe_times += 1
-            if swipe_times > times:
-                raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {u2_elem.desc}.")
+        return self.scroll_to(direction='left', times=times, upper=upper, height=height, index=index, **kwargs)
 
     @staticmethod
+    @mutating
     def swipe_right(times: int = 1, upper: bool = False, height: float = 0.9, start: float = 0.1,
                     end: float = 0.9) -> None:
         """swipe right"""
@@ -491,17 +970,20 @@ class U2Driver:
                 time.sleep(1)
 
     @staticmethod
+    @mutating
     def swipe_points(start_point: Tuple[float, float], end_point: Tuple[float, float], duration: int = 0.1):
         Seldom.driver.swipe_points([start_point, end_point], duration=duration)
         log.info(f'✅ Swipe from {start_point} to {end_point}.')
 
     @staticmethod
+    @mutating
     def screen_on() -> None:
         if not Seldom.driver.info.get('screenOn'):
             Seldom.driver.screen_on()
             log.info('✅ Screen ON.')
 
     @staticmethod
+    @mutating
     def open_url(url) -> None:
         Seldom.driver.open_url(url)
         log.info(f'✅ Open {url}.')
@@ -2,77 +2,168 @@
 import cv2
 import numpy as np
 import os
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
 
 from seldom_atx import AppConfig
 from seldom_atx.logging import log
+from seldom_atx.recording import read_frame_index
 
+# 分帧文件夹中的帧索引：每行 文件名,采集时间戳
+FRAME_INDEX = 'frames.idx'
+# 关键帧文件夹中的哈希索引
+HASH_INDEX = 'hashes.npz'
+# 参考图像的哈希值: {(path, size, mtime): hash}
+_REFERENCE_HASHES = {}
 
-def extract_frames(video_file, output_dir, start_duration=AppConfig.FRAME_SECONDS,
-                   end_duration=AppConfig.FRAME_SECONDS):
+
+def frame_ranges(total_frames, fps, timestamps=None, windows=None):
     """
-    视频分帧
-    :param video_file:
-    :param output_dir:
-    :param start_duration:
-    :param end_duration:
+    需要分析的帧号区间[(开始, 结束)]
+    :param total_frames: 视频总帧数
+    :param fps: 视频帧率
+    :param timestamps: 帧索引，有帧索引时按采集时间计算
+    :param windows: 分析的时间片段[(开始秒, 结束秒)]，负数表示距视频末尾，结束为None表示到末尾
     """
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    if timestamps:
+        total_frames = len(timestamps)
+        relative = np.asarray(timestamps[:total_frames]) - timestamps[0]
+        total_duration = timestamps[-1] - timestamps[0]
+    else:
+        total_duration = total_frames / fps if fps else 0
+    selected = np.zeros(total_frames, dtype=bool)
+    for start, end in windows:
+        if timestamps:
+            head = relative >= start if start >= 0 else relative > total_duration + start
+            if end is not None:
+                head &= relative < (end if end >= 0 else total_duration + end)
+            selected |= head
+        else:
+            # 片段时长大于总时长时截取为总时长
+            first = int(fps * start) if start >= 0 else total_frames - int(fps * min(-start, total_duration))
+            last = total_frames if end is None else int(fps * end) if end >= 0 else total_frames - int(fps * -end)
+            selected[max(first, 0):max(last, 0)] = True
+    # 连续的帧合并为区间
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], selected.astype(np.int8), [0]))))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
 
+def iter_frames(video_file, start_duration=AppConfig.FRAME_SECONDS, end_duration=AppConfig.FRAME_SECONDS,
+                windows=None, seek=None):
+    """
+    逐帧解码视频，返回分析片段中的帧：(帧号, 采集时间戳, BGR帧)，没有帧索引时采集时间戳为None
+    片段之外的帧只grab()不解码为图像，间隔较大时直接跳转
+    :param video_file:
+    :param start_duration: 默认分析前start_duration秒
+    :param end_duration: 默认分析后end_duration秒
+    :param windows: 分析的时间片段[(开始秒, 结束秒)]，负数表示距视频末尾，默认[(0, start_duration), (-end_duration, None)]
+    :param seek: 间隔较大时是否用CAP_PROP_POS_FRAMES跳转，默认只在没有帧索引(固定帧率)时跳转
+    """
     # 打开视频文件
     cap = cv2.VideoCapture(video_file)
     fps = cap.get(cv2.CAP_PROP_FPS)
     log.info("✅ 视频帧率为 {:.2f} fps/s.".format(fps))
 
-    # 计算帧数和总时长（以秒为单位）
+    # 计算帧数
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    total_duration = total_frames / fps
 
-    # 计算前5s片段的开始帧数和结束帧数
-    start_frame = 0
-    end_frame = int(fps * start_duration)
+    # 有帧索引时按真实采集时间截取片段
+    timestamps = read_frame_index(video_file)
+    if timestamps:
+        log.info(f"✅ Frame index: {len(timestamps)} frames, {timestamps[-1] - timestamps[0]:.2f}s.")
+    if windows is None:
+        windows = [(0, start_duration), (-end_duration, None)]
+    if seek is None:
+        # 可变帧率的视频按帧号跳转不准确
+        seek = not timestamps
+    ranges = frame_ranges(total_frames, fps, timestamps, windows)
 
-    # 如果末尾5s片段时长大于总时长，则设置为总时长
-    if end_duration > total_duration:
-        end_duration = total_duration
+    # 当前帧数
+    current_frame = 0
+    try:
+        for start, end in ranges:
+            # 间隔超过2s时跳转，否则只grab()
+            if seek and start - current_frame > fps * 2:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+                current_frame = start
+            while current_frame < start:
+                if not cap.grab():
+                    return
+                current_frame += 1
+            while current_frame < end:
+                # 读取一帧，如果未读取到帧，则结束
+                ret, frame = cap.read()
+                if not ret:
+                    return
+                yield current_frame, timestamps[current_frame] if timestamps else None, frame
+                current_frame += 1
+    finally:
+        # 释放视频对象
+        cap.release()
 
-    # 计算末尾5s片段的开始帧数和结束帧数
-    end_start_frame = total_frames - int(fps * end_duration)
-    end_end_frame = total_frames
 
-    # 初始化计数器和当前帧数
-    frame_count = 0
-    current_frame = 0
+def extract_frames(video_file, output_dir, start_duration=AppConfig.FRAME_SECONDS,
+                   end_duration=AppConfig.FRAME_SECONDS, windows=None):
+    """
+    视频分帧
+    :param video_file:
+    :param output_dir:
+    :param start_duration:
+    :param end_duration:
+    :param windows: 分析的时间片段，见iter_frames
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    index_file = None
+    for frame_count, timestamp, frame in iter_frames(video_file, start_duration, end_duration, windows):
+        # 生成输出文件名
+        output_file = os.path.join(output_dir, f"frame_{frame_count:06d}.jpg")
 
-    # 循环读取视频帧
-    while True:
-        # 读取一帧
-        ret, frame = cap.read()
+        # 保存帧为图像文件
+        cv2.imwrite(output_file, frame)
+        if timestamp is not None:
+            if index_file is None:
+                index_file = open(os.path.join(output_dir, FRAME_INDEX), 'w')
+            index_file.write(f"{os.path.basename(output_file)},{timestamp:.6f}\n")
+    if index_file is not None:
+        index_file.close()
 
-        # 如果未读取到帧，则结束循环
-        if not ret:
-            break
 
-        # 如果当前帧数在前5s或末尾5s范围内，则进行保存
-        if start_frame <= current_frame < end_frame or end_start_frame <= current_frame < end_end_frame:
-            # 生成输出文件名
-            output_file = os.path.join(output_dir, f"frame_{frame_count:06d}.jpg")
+def read_extracted_index(output_dir):
+    """读取分帧文件夹的帧索引，返回 {文件名: 采集时间戳}，没有帧索引时返回None"""
+    path = os.path.join(output_dir, FRAME_INDEX)
+    if not os.path.exists(path):
+        return None
+    timestamps = {}
+    with open(path) as f:
+        for line in f:
+            filename, timestamp = line.strip().split(',')
+            timestamps[filename] = float(timestamp)
+    return timestamps
 
-            # 保存帧为图像文件
-            cv2.imwrite(output_file, frame)
 
-        # 更新计数器
-        frame_count += 1
+def get_duration(video_file, start_frame, stop_frame):
+    """
+    计算两帧之间的耗时(s)：有帧索引时使用真实采集时间，否则按AppConfig.FPS换算
+    :param video_file:
+    :param start_frame: 开始帧的帧号
+    :param stop_frame: 结束帧的帧号
+    """
+    timestamps = read_frame_index(video_file)
+    if timestamps and max(start_frame, stop_frame) < len(timestamps):
+        return round(timestamps[stop_frame] - timestamps[start_frame], 2)
+    return round((stop_frame - start_frame) / AppConfig.FPS, 2)
 
-        # 更新当前帧数
-        current_frame += 1
 
-    # 释放视频对象
-    cap.release()
+# 每个字节中1的个数
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
 
 
 def calculate_hash(image, hash_size=256):
-    """Calculate the hash value of the input image"""
+    """
+    Calculate the hash value of the input image
+    每个像素与均值比较得到一位，按行展开后打包为uint64数组
+    """
     # 将图像调整为指定大小，并转换为灰度图像
     image = cv2.resize(image, (hash_size, hash_size))
     gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
@@ -80,79 +171,297 @@ def calculate_hash(image, hash_size=256):
     # 计算均值
     mean = np.mean(gray)
 
-    # 生成哈希值
-    hash = []
-    for i in range(hash_size):
-        for j in range(hash_size):
-            if gray[i, j] > mean:
-                hash.append(1)
-            else:
-                hash.append(0)
+    # 生成哈希值，不足8字节的部分补0
+    packed = np.packbits(gray > mean)
+    packed = np.pad(packed, (0, -len(packed) % 8))
+    return packed.view(np.uint64)
+
+
+def _packed(image_hash):
+    """兼容旧的0/1列表格式的哈希值"""
+    if isinstance(image_hash, np.ndarray) and image_hash.dtype == np.uint64:
+        return image_hash
+    packed = np.packbits(np.asarray(image_hash, dtype=bool))
+    return np.pad(packed, (0, -len(packed) % 8)).view(np.uint64)
 
-    return hash
+
+def hamming_distance(hash1, hash2):
+    """两个哈希值不同的位数：异或后统计1的个数"""
+    return int(POPCOUNT[np.bitwise_xor(_packed(hash1), _packed(hash2)).view(np.uint8)].sum())
 
 
 def get_image_diff(image1_path=None, image2_path=None, image1_hash=None, image2_hash=None):
     """
     计算当前图像和参考图像的哈希距离
     """
-    if image1_hash:
+    if image1_hash is not None:
         hash1 = image1_hash
     elif os.path.exists(image1_path):
         image = cv2.imread(image1_path)
         hash1 = calculate_hash(image)
     else:
         raise FileNotFoundError(f"No such file or directory: {image1_path}")
-    if image2_hash:
+    if image2_hash is not None:
         hash2 = image2_hash
     elif os.path.exists(image2_path):
         image = cv2.imread(image2_path)
         hash2 = calculate_hash(image)
     else:
         raise FileNotFoundError(f"No such file or directory: {image2_path}")
-    distance = sum([a != b for a, b in zip(hash1, hash2)])
+    distance = hamming_distance(hash1, hash2)
     return distance
 
 
-def find_best_frame(reference_image_path, image_folder_path, is_start=True):
-    """Find the image with the highest similarity to the reference image in the given image folder"""
-    # 加载参考图像，并计算其哈希值
-    reference_image = cv2.imread(reference_image_path)
-    reference_hash = calculate_hash(reference_image)
+def reference_hash(reference_image_path):
+    """参考图像的哈希值，按文件缓存，多次执行时不重复计算"""
+    stat = os.stat(reference_image_path)
+    key = (os.path.abspath(reference_image_path), stat.st_size, stat.st_mtime_ns)
+    if key not in _REFERENCE_HASHES:
+        _REFERENCE_HASHES[key] = calculate_hash(cv2.imread(reference_image_path))
+    return _REFERENCE_HASHES[key]
+
+
+class FrameHashes:
+    """
+    分帧文件夹的哈希矩阵(帧数 × uint64个数)：每帧只读取和计算一次，
+    与任意参考图像的汉明距离一次向量化计算，开始帧和结束帧的查找复用同一个矩阵
+    """
+    # 最近使用的文件夹: {(path, ((文件名, size, mtime), ...)): FrameHashes}
+    _cache = {}
+    CACHE_SIZE = 4
+
+    def __init__(self, image_folder_path):
+        self.folder = image_folder_path
+        # 与逐个遍历时一致：按os.listdir的顺序，位置包括非jpg的文件
+        entries = os.listdir(image_folder_path)
+        self.entries = len(entries)
+        self.names = [filename for filename in entries if filename.endswith('.jpg')]
+        self.positions = np.array([i for i, filename in enumerate(entries) if filename.endswith('.jpg')], dtype=int)
+        self.timestamps = read_extracted_index(image_folder_path)
+        hashes = [calculate_hash(cv2.imread(os.path.join(image_folder_path, filename))) for filename in self.names]
+        self.matrix = np.stack(hashes) if hashes else np.empty((0, 0), dtype=np.uint64)
+
+    @classmethod
+    def of(cls, image_folder_path):
+        """
+        文件夹的哈希矩阵，文件夹中的文件都未变化时复用
+        按每个文件的大小和修改时间判断：文件夹的mtime精度较低，且文件被原地改写时不变
+        """
+        files = tuple(sorted((entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+                             for entry in os.scandir(image_folder_path)))
+        key = (os.path.abspath(image_folder_path), files)
+        if key not in cls._cache:
+            if len(cls._cache) >= cls.CACHE_SIZE:
+                cls._cache.pop(next(iter(cls._cache)))
+            cls._cache[key] = cls(image_folder_path)
+        return cls._cache[key]
+
+    def distances(self, reference_hash):
+        """所有帧与参考图像的汉明距离"""
+        return hash_distances(self.matrix, reference_hash)
 
-    # 遍历图像文件夹中的所有图像，并计算它们的哈希值
-    frame_path_list = os.listdir(image_folder_path)
+    def window(self, is_start=True):
+        """开始片段或结束片段中的帧"""
+        timestamps = None
+        if self.timestamps:
+            timestamps = np.array([self.timestamps.get(filename, np.nan) for filename in self.names])
+        return window(self.positions, self.entries, timestamps, is_start)
+
+    def best_frame(self, reference_hash, is_start=True):
+        """最相似的帧的路径"""
+        k = best_index(self.distances(reference_hash), np.flatnonzero(self.window(is_start)), is_start)
+        return os.path.join(self.folder, self.names[k])
+
+
+def best_index(distances, candidates, is_start=True):
+    """
+    按顺序在候选帧中查找最相似的帧，规则与逐帧比较时一致：
+    开始帧：距离不大于当前最优或与当前最优相差小于100时更新，取最后一个
+    结束帧：记录每次距离变小的帧，取第一个与最终最优相差小于100的帧
+    :param distances: 所有帧与参考图像的汉明距离
+    :param candidates: 候选帧的下标
+    """
     best_match = None
     best_distance = float('inf')
-    if len(frame_path_list) <= int(AppConfig.FRAME_SECONDS * AppConfig.FPS) * 2:
-        start_frame_num = len(frame_path_list) if is_start is True else 0
-    else:
-        start_frame_num = AppConfig.FRAME_SECONDS * AppConfig.FPS
     end_list = []
-    for i, filename in enumerate(frame_path_list):
-        if is_start and i < start_frame_num:
-            if filename.endswith('.jpg'):
-                path = os.path.join(image_folder_path, filename)
-                distance = get_image_diff(image1_path=path, image2_hash=reference_hash)
-                # 更新最相似的图像
-                if distance <= best_distance or abs(best_distance - distance) < 100:
-                    best_match = path
-                    best_distance = distance
-
-        elif not is_start and i >= start_frame_num:
-            if filename.endswith('.jpg'):
-                path = os.path.join(image_folder_path, filename)
-                distance = get_image_diff(image1_path=path, image2_hash=reference_hash)
-                # 更新最相似的图像
-                if distance < best_distance:
-                    best_match = path
-                    best_distance = distance
-                    end_list.append({'best_match': path, 'best_distance': distance})
+    for k in candidates:
+        distance = int(distances[k])
+        if is_start:
+            if distance <= best_distance or abs(best_distance - distance) < 100:
+                best_match = k
+                best_distance = distance
+        elif distance < best_distance:
+            best_match = k
+            best_distance = distance
+            end_list.append({'best_match': k, 'best_distance': distance})
     if not is_start:
         best_match_list = []
         for end in end_list:
             if abs(best_distance - end['best_distance']) < 100:
                 best_match_list.append(end['best_match'])
         best_match = best_match_list[0]
-    # 输出最相似的图像路径
     return best_match
+
+
+def hash_distances(matrix, reference_hash):
+    """哈希矩阵每一行与参考哈希的汉明距离"""
+    if not len(matrix):
+        return np.empty(0, dtype=np.int64)
+    xor = np.bitwise_xor(matrix, _packed(reference_hash))
+    return POPCOUNT[xor.view(np.uint8)].sum(axis=1, dtype=np.int64)
+
+
+def window(positions, entries, timestamps=None, is_start=True):
+    """
+    开始片段或结束片段中的帧
+    :param positions: 每帧在遍历顺序中的位置
+    :param entries: 遍历的总数
+    :param timestamps: 每帧的采集时间戳，有时按采集时间划分
+    """
+    if entries <= int(AppConfig.FRAME_SECONDS * AppConfig.FPS) * 2:
+        start_frame_num = entries if is_start is True else 0
+    else:
+        start_frame_num = AppConfig.FRAME_SECONDS * AppConfig.FPS
+    in_start = positions < start_frame_num
+    in_end = positions >= start_frame_num
+    if timestamps is not None and len(timestamps):
+        valid = ~np.isnan(timestamps)
+        if valid.any():
+            first, last = np.nanmin(timestamps), np.nanmax(timestamps)
+            whole = last - first <= AppConfig.FRAME_SECONDS * 2
+            in_start = np.where(valid, whole | (timestamps - first < AppConfig.FRAME_SECONDS), in_start)
+            in_end = np.where(valid, whole | ~in_start, in_end)
+    return in_start if is_start else in_end
+
+
+class VideoHashes:
+    """
+    视频前后片段中每帧的哈希：解码一次，在内存中计算，不保存分帧图片
+    只保存紧凑的哈希索引(.npz)：帧号、采集时间戳、哈希矩阵
+    """
+
+    def __init__(self, video_file, frames, timestamps, matrix):
+        self.video_file = video_file
+        self.frames = np.asarray(frames, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+        self.matrix = matrix
+
+    @classmethod
+    def from_video(cls, video_file, start_duration=AppConfig.FRAME_SECONDS, end_duration=AppConfig.FRAME_SECONDS,
+                   windows=None):
+        frames, timestamps, hashes = [], [], []
+        for frame_count, timestamp, frame in iter_frames(video_file, start_duration, end_duration, windows):
+            frames.append(frame_count)
+            timestamps.append(np.nan if timestamp is None else timestamp)
+            hashes.append(calculate_hash(frame))
+        matrix = np.stack(hashes) if hashes else np.empty((0, 0), dtype=np.uint64)
+        return cls(video_file, frames, timestamps, matrix)
+
+    def save(self, path):
+        """保存哈希索引"""
+        np.savez_compressed(path, frames=self.frames, timestamps=self.timestamps, matrix=self.matrix)
+        return path
+
+    @classmethod
+    def load(cls, video_file, path):
+        data = np.load(path)
+        return cls(video_file, data['frames'], data['timestamps'], data['matrix'])
+
+    def best_frame(self, reference_hash, is_start=True):
+        """最相似的帧的帧号"""
+        positions = np.arange(len(self.frames))
+        candidates = np.flatnonzero(window(positions, len(self.frames), self.timestamps, is_start))
+        k = best_index(hash_distances(self.matrix, reference_hash), candidates, is_start)
+        return int(self.frames[k])
+
+    def save_images(self, outputs):
+        """
+        只保存选中的几帧：顺序grab()到帧号后再解码为图像，不跳转：可变帧率的视频按帧号跳转不准确
+        :param outputs: {帧号: 保存的文件}
+        """
+        cap = cv2.VideoCapture(self.video_file)
+        current_frame = 0
+        try:
+            for frame_number in sorted(outputs):
+                while current_frame <= frame_number:
+                    if not cap.grab():
+                        raise ValueError(f"Frame {frame_number} is out of {self.video_file}.")
+                    current_frame += 1
+                ret, frame = cap.retrieve()
+                if not ret:
+                    raise ValueError(f"Frame {frame_number} of {self.video_file} can not be decoded.")
+                cv2.imwrite(outputs[frame_number], frame)
+        finally:
+            cap.release()
+        return outputs
+
+
+def find_key_frames(video_file, start_path, stop_path, output_dir):
+    """
+    解码一次视频，在内存中查找开始帧和结束帧，只保存两张关键帧和哈希索引
+    :param video_file:
+    :param start_path: 开始帧的参考图像
+    :param stop_path: 结束帧的参考图像
+    :param output_dir: 关键帧和哈希索引(hashes.npz)保存的文件夹
+    :return: (开始帧号, 开始帧图片, 结束帧号, 结束帧图片)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    hashes = VideoHashes.from_video(video_file)
+    hashes.save(os.path.join(output_dir, HASH_INDEX))
+    start_frame = hashes.best_frame(reference_hash(start_path), is_start=True)
+    stop_frame = hashes.best_frame(reference_hash(stop_path), is_start=False)
+    start_frame_path = os.path.join(output_dir, f"frame_{start_frame:06d}.jpg")
+    stop_frame_path = os.path.join(output_dir, f"frame_{stop_frame:06d}.jpg")
+    hashes.save_images({start_frame: start_frame_path, stop_frame: stop_frame_path})
+    return start_frame, start_frame_path, stop_frame, stop_frame_path
+
+
+def find_best_frame(reference_image_path, image_folder_path, is_start=True):
+    """Find the image with the highest similarity to the reference image in the given image folder"""
+    return FrameHashes.of(image_folder_path).best_frame(reference_hash(reference_image_path), is_start)
+
+
+def analyze_video(video_file, start_path, stop_path, output_dir, frame_seconds=None, fps=None):
+    """
+    耗时分析：查找开始帧和结束帧并计算耗时，可在子进程中执行
+    :param frame_seconds: 子进程中的AppConfig.FRAME_SECONDS
+    :param fps: 子进程中的AppConfig.FPS
+    :return: (耗时, 开始帧图片, 结束帧图片)
+    """
+    if frame_seconds is not None:
+        AppConfig.FRAME_SECONDS = frame_seconds
+    if fps is not None:
+        AppConfig.FPS = fps
+    start_frame, start_frame_path, stop_frame, stop_frame_path = find_key_frames(
+        video_file, start_path, stop_path, output_dir)
+    return get_duration(video_file, start_frame, stop_frame), start_frame_path, stop_frame_path
+
+
+class AnalysisPool:
+    """
+    耗时分析的进程池：每次执行的录屏结束后提交分析，下一次执行立即开始，最后统一取结果
+    AppConfig.ANALYSIS_WORKERS大于0时使用fork的进程池；为0或系统不支持fork时在当前进程中直接分析
+    """
+    pool = None
+
+    @classmethod
+    def submit(cls, video_file, start_path, stop_path, output_dir) -> Future:
+        args = (video_file, start_path, stop_path, output_dir, AppConfig.FRAME_SECONDS, AppConfig.FPS)
+        if not AppConfig.ANALYSIS_WORKERS:
+            future = Future()
+            try:
+                future.set_result(analyze_video(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if cls.pool is None:
+            if 'fork' not in multiprocessing.get_all_start_methods():
+                # spawn的子进程会重新导入seldom_atx(monkey patch、adb)和用户的__main__，不使用
+                log.info("✅ Video analysis pool needs fork, analyse in the current process.")
+                AppConfig.ANALYSIS_WORKERS = 0
+                return cls.submit(video_file, start_path, stop_path, output_dir)
+            # fork的子进程不重新导入任何模块，只执行cv2/numpy的分析
+            cls.pool = ProcessPoolExecutor(max_workers=AppConfig.ANALYSIS_WORKERS,
+                                           mp_context=multiprocessing.get_context('fork'))
+        log.info(f"✅ Submit video analysis -> {video_file}.")
+        return cls.pool.submit(analyze_video, *args)
@@ -3,7 +3,8 @@ from functools import wraps
 import gevent
 from seldom_atx import Seldom
 from seldom_atx.logging import log
-from seldom_atx.utils.app._duration import get_image_diff
+from seldom_atx.running.config import AppConfig
+from seldom_atx.utils.app._duration import get_image_diff, calculate_hash
 from seldom_atx.u2driver import u2
 from seldom_atx.wdadriver import wda_
 
@@ -17,12 +18,15 @@ class constant:
 def screenshot_and_compare(file_path, compare_image_path):
     """screenshot_and_compare"""
     if Seldom.platform_name == 'Android':
-        u2.save_screenshot(file_path=file_path)
+        # 原始截图直接计算哈希，不再重新读取文件
+        frame = u2.capture(scale=AppConfig.COMPARE_SCALE, file_path=file_path)
+        constant.distance = get_image_diff(image1_hash=calculate_hash(frame[:, :, ::-1]),
+                                           image2_path=compare_image_path)
     elif Seldom.platform_name == 'iOS':
-        wda_.save_screenshot(file_path=file_path)
+        wda_.save_screenshot(file_path=file_path, sync=True)
+        constant.distance = get_image_diff(image1_path=file_path, image2_path=compare_image_path)
     else:
         raise Exception('Unsupported platform')
-    constant.distance = get_image_diff(image1_path=file_path, image2_path=compare_image_path)
     log.success(f'用例截图对比差异值为：{constant.distance}')
     return constant.distance
 
@@ -95,8 +95,9 @@ def get_perf():
         log.error(f"❌ Error in get_perf: {e}.")
 
 
-def start_record(video_path, run_path):
-    while not os.path.exists(run_path):
+def start_record(video_path, run_path=None):
+    """等待用例中调用start_recording后开始录屏"""
+    while run_path and not os.path.exists(run_path):
         time.sleep(1)
     while AppDecorator.threadLock and Seldom.driver:
         if AppDecorator.record:
@@ -153,6 +154,7 @@ def App(RunList: list = [], start_path: str = None, stop_path: str = None, durat
             flo_base64_list = []
             start_frame_list = []
             stop_frame_list = []
+            analysis_list = []
             run_times = AppConfig.DURATION_TIMES if SeldomDecorator.Duration in RunList and duration_times == 1 else duration_times
             for current_times in range(run_times):
                 AppDecorator.threadLock = True
@@ -161,9 +163,9 @@ def App(RunList: list = [], start_path: str = None, stop_path: str = None, durat
                 video_path = os.path.join(current_outputFolder, f'{func_name}_{current_times}.mp4')
                 # Android日志保存的路径
                 log_path = os.path.join(current_outputFolder, f'{func_name}_{current_times}.log')
-                # 分帧保存的文件夹
+                # 每次执行的输出文件夹
                 frame_folder = os.path.join(current_outputFolder, f'{func_name}_{current_times}')
-                # 识别的关键帧保存的文件夹
+                # 识别的关键帧和哈希索引保存的文件夹
                 key_frame_folder = os.path.join(frame_folder, 'key_frame')
                 # 性能数据图表的路径
                 perf_path = os.path.join(current_outputFolder, f'{func_name}_perf_{current_times}')
@@ -174,7 +176,7 @@ def App(RunList: list = [], start_path: str = None, stop_path: str = None, durat
                 do_list = []
                 for run in RunList:
                     if run == SeldomDecorator.Duration:
-                        do_list.append(gevent.spawn())
+                        do_list.append(gevent.spawn(start_record, video_path))
                     elif run == SeldomDecorator.Performance:
                         do_list.append(gevent.spawn(get_perf))
                     elif run == SeldomDecorator.Effect:
@@ -190,17 +192,10 @@ def App(RunList: list = [], start_path: str = None, stop_path: str = None, durat
                     log.error(f'{AppDecorator.CASE_ERROR}')
                     assert False, f'{AppDecorator.CASE_ERROR}'
                 if SeldomDecorator.Duration in RunList:
-                    _duration.extract_frames(video_file=video_path, output_dir=frame_folder)
                     if not AppDecorator.RECORD_ERROR:
-                        start_frame_path = _duration.find_best_frame(start_path, frame_folder, is_start=True)
-                        start_frame = int(os.path.split(start_frame_path)[1].split('.')[0][-6:])
-
-                        stop_frame_path = _duration.find_best_frame(stop_path, frame_folder, is_start=False)
-                        stop_frame = int(os.path.split(stop_frame_path)[1].split('.')[0][-6:])
-                        duration = round((stop_frame - start_frame) / AppConfig.FPS, 2)
-                        duration_list.append(duration)
-                        start_frame_list.append(_common.image_to_base64(start_frame_path))
-                        stop_frame_list.append(_common.image_to_base64(stop_frame_path))
+                        # 录屏结束后提交到进程池分析，下一次执行立即开始
+                        analysis_list.append(
+                            _duration.AnalysisPool.submit(video_path, start_path, stop_path, key_frame_folder))
                 if SeldomDecorator.Performance in RunList and not AppDecorator.PERF_ERROR:
                     cpu_info = cache.get('CPU_INFO')
                     cpu_image_path = os.path.join(perf_path, f'{func_name}_CPU.jpg')
@@ -219,6 +214,12 @@ def App(RunList: list = [], start_path: str = None, stop_path: str = None, durat
                         fps_base64_list.append(
                             _common.draw_chart(fps_info[1], fps_info[0], ['fps', 'jank'], jpg_name=fps_image_path,
                                                label_title='Fps'))
+            # 按执行顺序取回耗时分析的结果
+            for analysis in analysis_list:
+                duration, start_frame_path, stop_frame_path = analysis.result()
+                duration_list.append(duration)
+                start_frame_list.append(_common.image_to_base64(start_frame_path))
+                stop_frame_list.append(_common.image_to_base64(stop_frame_path))
             if SeldomDecorator.Performance in RunList and not AppDecorator.PERF_ERROR:
                 photo_list = cpu_base64_list + mem_base64_list + fps_base64_list + flo_base64_list \
                              + bat_base64_list + start_frame_list + stop_frame_list
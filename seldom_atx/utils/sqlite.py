@@ -187,6 +187,50 @@ class Config(SQLiteDB):
         self.execute_sql(sql)
 
 
+class Coordinate(SQLiteDB):
+    """
+    坐标缓存表：(package, activity, fingerprint, locator) -> bounds
+    """
+
+    def __init__(self):
+        super(Coordinate, self).__init__()
+        self.table = DataBase.COORD_TABLE
+        # 兼容旧项目：数据库中没有该表时创建
+        self.execute_sql(f"""CREATE TABLE IF NOT EXISTS {self.table} (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                         package TEXT, activity TEXT, fingerprint TEXT, locator TEXT, bounds TEXT);""")
+
+    def get(self, package: str, activity: str, locator: str, fingerprint: str = None):
+        """
+        获取最近一次缓存的坐标
+        :return: (fingerprint, bounds) or None
+        """
+        sql = f"""select fingerprint, bounds from {self.table} where package=? and activity=? and locator=?"""
+        args = [package, activity, locator]
+        if fingerprint is not None:
+            sql += " and fingerprint=?"
+            args.append(fingerprint)
+        query_res = self.query_sql(sql + " order by id desc limit 1", args)
+        if not query_res:
+            return None
+        fingerprint, bounds = query_res[0]
+        return fingerprint, tuple(json.loads(bounds))
+
+    def set(self, package: str, activity: str, fingerprint: str, locator: str, bounds: tuple):
+        """缓存坐标，相同页面相同定位只保留一条"""
+        self.delete(package, activity, locator, fingerprint)
+        sql = f"""insert into {self.table}(package,activity,fingerprint,locator,bounds) values (?,?,?,?,?)"""
+        self.execute_sql(sql, (package, activity, fingerprint, locator, json.dumps(list(bounds))))
+
+    def delete(self, package: str, activity: str, locator: str, fingerprint: str = None):
+        """删除缓存的坐标，不指定fingerprint时删除该定位在所有页面状态下的缓存"""
+        sql = f"""delete from {self.table} where package=? and activity=? and locator=?"""
+        args = [package, activity, locator]
+        if fingerprint is not None:
+            sql += " and fingerprint=?"
+            args.append(fingerprint)
+        self.execute_sql(sql, args)
+
+
 # config = Config()
 if __name__ == '__main__':
     db = SQLiteDB()
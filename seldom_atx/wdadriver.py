@@ -1,20 +1,25 @@
-import base64
 import os
 import time
 import contextlib
 import io
 import socket
 import threading
-from datetime import datetime
-from typing import Tuple
+from typing import List, Optional, Tuple
 import imageio
 import tidevice
+from wda import Rect, Selector
+from wda.exceptions import WDAElementNotFoundError, WDAStaleElementReferenceError
 from seldom_atx.logging import log
 from seldom_atx.logging.exceptions import NotFindElementError
 from seldom_atx.running.config import Seldom, AppConfig
 from seldom_atx.running.loader_hook import loader
+from seldom_atx.hierarchy import Snapshot
+from seldom_atx.polling import backoff
+from seldom_atx.wdaquery import compile_query
+from seldom_atx.screenshot import ScreenshotWriter
+from seldom_atx.recording import MJPEGWriter, VideoEncoder, FrameIndexWriter, FlightRecorder
 
-__all__ = ["WDADriver", "WDAElement", "make_screenrecord", "wda_"]
+__all__ = ["WDADriver", "WDAElement", "WDAElementHandle", "make_screenrecord", "wda_"]
 
 keycodes = {
     'home': 'home',
@@ -33,12 +38,38 @@ LOCATOR_LIST = {
     'label': "label"
 }
 
+# raised by WDA when a resolved element no longer exists
+STALE_ERRORS = (WDAStaleElementReferenceError, WDAElementNotFoundError)
+
+
+class CompiledSelector(Selector):
+    """Selector for a compiled query, the query is complete and must not be rewritten by wda."""
+
+    def _fix_xcui_type(self, s):
+        return s
+
 
 class WDAObj:
     c = None  # device
     s = None  # session
     e = None  # element
 
+    @staticmethod
+    def selector(index: int = 0, visible: bool = None, **kwargs) -> Selector:
+        """
+        Selector with the locator compiled to a class chain, the index is part of the query.
+        Falls back to the wda selector when the locator can not be compiled.
+        """
+        query = compile_query(index, visible, **kwargs)
+        if query is None:
+            return WDAObj.s(**kwargs, visible=visible, index=index)
+        using, value = query
+        if using == 'class chain':
+            return CompiledSelector(WDAObj.s, classChain=value)
+        if using == 'xpath':
+            return WDAObj.s(xpath=value)
+        return WDAObj.s(id=value)
+
     @staticmethod
     def t():
         t = tidevice.Device(udid=(loader("device_id") if loader(
@@ -52,34 +83,60 @@ class SocketBuffer:
     Since I can't find a lib that can buffer socket read and write, so I write a one
     copy过来的方法：SocketBuffer 类是一个用于缓冲套接字读写操作的自定义实用工具类。
     它对原始套接字执行的操作进行封装，以便更方便地从套接字中读取数据或向套接字发送数据。
+    Backed by a preallocated buffer: recv_into reads straight into it, delimiter search resumes where
+    the last one stopped, and reads return zero-copy memoryviews that stay valid until the next read.
     """
+    # free space kept for every recv_into
+    MIN_RECV = 64 * 1024
 
-    def __init__(self, sock: socket.socket):
+    def __init__(self, sock: socket.socket, size: int = 256 * 1024):
         self._sock = sock
-        self._buf = bytearray()
+        self._buf = bytearray(max(size, self.MIN_RECV))
+        self._view = memoryview(self._buf)
+        self._start = 0  # start of unread data
+        self._end = 0  # end of unread data
+        self._scan = 0  # where the delimiter search resumes
+
+    def _compact(self):
+        """Move unread data to the front, grow the buffer if there is still not enough free space"""
+        size = self._end - self._start
+        if len(self._buf) - size < self.MIN_RECV:
+            buf = bytearray(len(self._buf) * 2)
+            buf[:size] = self._view[self._start:self._end]
+            self._buf, self._view = buf, memoryview(buf)
+        else:
+            self._view[:size] = self._view[self._start:self._end]
+        self._scan = max(self._scan - self._start, 0)
+        self._start, self._end = 0, size
 
     def _drain(self):
-        _data = self._sock.recv(1024)
-        if _data is None:
+        if self._start == self._end:
+            self._start = self._end = self._scan = 0
+        elif len(self._buf) - self._end < self.MIN_RECV:
+            self._compact()
+        length = self._sock.recv_into(self._view[self._end:])
+        if not length:
             raise IOError("socket closed")
-        self._buf.extend(_data)
-        return len(_data)
+        self._end += length
+        return length
 
-    def read_until(self, delimeter: bytes) -> bytes:
+    def read_until(self, delimeter: bytes) -> memoryview:
         """ return without delimeter """
         while True:
-            index = self._buf.find(delimeter)
+            index = self._buf.find(delimeter, max(self._scan, self._start), self._end)
             if index != -1:
-                _return = self._buf[:index]
-                self._buf = self._buf[index + len(delimeter):]
+                _return = self._view[self._start:index]
+                self._start = self._scan = index + len(delimeter)
                 return _return
+            self._scan = max(self._start, self._end - len(delimeter) + 1)
             self._drain()
 
-    def read_bytes(self, length: int) -> bytes:
-        while length > len(self._buf):
+    def read_bytes(self, length: int) -> memoryview:
+        while length > self._end - self._start:
             self._drain()
 
-        _return, self._buf = self._buf[:length], self._buf[length:]
+        _return = self._view[self._start:self._start + length]
+        self._start += length
         return _return
 
     def write(self, data: bytes):
@@ -109,7 +166,7 @@ class WDAElement:
 
     def get_elements(self, index: int = 0, visible: bool = True, empty: bool = False, timeout: float = None):
         try:
-            WDAObj.e = WDAObj.s(**self.kwargs, visible=visible, index=index).get(timeout=timeout)
+            WDAObj.e = WDAObj.selector(index, visible, **self.kwargs).get(timeout=timeout)
         except Exception as e:
             if empty is False:
                 raise NotFindElementError(f"❌ Find element error: {self.desc} -> {e}.")
@@ -129,8 +186,73 @@ class WDAElement:
         return self.find_elem_warn
 
 
+class WDAElementHandle:
+    """
+    A resolved element: locate it once, cache the element id and bounds, and chain actions on it.
+    It is located again only when an action reports a stale element.
+
+    Usage:
+        wda_.element(name='username').click().clear().type('seldom')
+    """
+
+    def __init__(self, index: int = 0, visible: bool = True, **kwargs) -> None:
+        self.wda_elem = WDAElement(**kwargs)
+        self.desc = self.wda_elem.desc
+        self.index = index
+        self.visible = visible
+        self.elem = None
+        self.bounds = None
+
+    def resolve(self, timeout: float = None):
+        """Locate the element and cache its bounds."""
+        self.elem = self.wda_elem.get_elements(index=self.index, visible=self.visible, timeout=timeout)
+        self.bounds = self.elem.bounds
+        return self
+
+    def _perform(self, action):
+        """Run an element action, locate again and retry once if the element is stale."""
+        if self.elem is None:
+            self.resolve()
+        try:
+            return action(self.elem)
+        except STALE_ERRORS:
+            log.info(f"⌛ {self.desc} -> stale element, resolve again.")
+            self.resolve()
+            return action(self.elem)
+
+    def click(self):
+        """Click the cached center of the element."""
+        if self.bounds is None:
+            self.resolve()
+        x, y = self.bounds.center
+        WDAObj.s.click(x, y)
+        log.info(f"✅ {self.desc} -> click.")
+        return self
+
+    def clear(self):
+        """Clear the contents of the input box."""
+        self._perform(lambda elem: elem.clear_text())
+        log.info(f"✅ {self.desc} -> clear input.")
+        return self
+
+    def type(self, text: str, enter: bool = False):
+        """Input text into the element, enter=True sends a trailing newline with the text."""
+        # wda Client.press only supports home/volumeUp/volumeDown
+        self._perform(lambda elem: elem.set_text(text + "\n" if enter is True else text))
+        log.info(f"✅ {self.desc} -> input '{text}'.")
+        return self
+
+    def get_text(self) -> str:
+        """Get element text information."""
+        text = self._perform(lambda elem: elem.text)
+        log.info(f"✅ {self.desc} -> get text: {text}.")
+        return text
+
+
 class WDADriver:
     """iOS驱动"""
+    # flight recorder, keeps the latest frames and saves them when a case fails
+    flight_recorder = None
 
     def __init__(self):
         WDAObj.c = Seldom.driver
@@ -193,6 +315,17 @@ class WDADriver:
 
         return self
 
+    @staticmethod
+    def element(index: int = 0, timeout: float = None, **kwargs) -> WDAElementHandle:
+        """
+        Get a resolved element handle, actions on it do not locate the element again.
+
+        Usage:
+            self.element(name='Login').click()
+            self.element(name='username').clear().type('seldom', enter=True)
+        """
+        return WDAElementHandle(index=index, **kwargs).resolve(timeout=timeout)
+
     def set_text(self, text: str, clear: bool = False, enter: bool = False, click: bool = False, index: int = 0,
                  **kwargs) -> None:
         """
@@ -201,17 +334,13 @@ class WDADriver:
         Usage:
             self.type(css="#el", text="selenium")
         """
+        handle = self.element(index=index, **kwargs)
         if clear is True:
-            self.clear_text(index, **kwargs)
+            handle.clear()
         if click is True:
-            self.click(index, **kwargs)
+            handle.click()
             time.sleep(0.5)
-        wda_elem = WDAElement(**kwargs)
-        elem = wda_elem.get_elements(index)
-        log.info(f"✅ {wda_elem.info} -> input '{text}'.")
-        elem.set_text(text)
-        if enter is True:
-            elem.press('enter')
+        handle.type(text, enter=enter)
 
     @staticmethod
     def clear_text(index: int = 0, **kwargs) -> None:
@@ -271,27 +400,128 @@ class WDADriver:
     def get_display(index: int = 0, **kwargs) -> bool:
         """获取当前某元素的可见状态"""
         wda_elem = WDAElement(**kwargs)
-        result = WDAObj.s(**wda_elem.kwargs, visible=True, index=index).exists
+        result = WDAObj.selector(index, True, **wda_elem.kwargs).exists
         log.info(f"✅ {wda_elem.desc} -> exists: {result}.")
         return result
 
+    def exists_now(self, index: int = 0, **kwargs) -> bool:
+        """
+        Check whether the element is visible right now, without waiting.
+
+        Usage:
+        self.exists_now(name='Upgrade')
+        """
+        wda_elem = WDAElement(**kwargs)
+        result = self._visible_now(index, wda_elem.kwargs, self._source_once())
+        log.info(f"✅ {wda_elem.desc} -> exists now: {result}.")
+        return result
+
+    def absent_for(self, duration: float, index: int = 0, **kwargs) -> bool:
+        """
+        Check that the element stays invisible for duration seconds, return False as soon as it shows up.
+
+        Usage:
+        self.absent_for(2, name='Load failed')
+        """
+        wda_elem = WDAElement(**kwargs)
+        log.info(f"⌛ {wda_elem.desc} -> keep absent: {duration}s.")
+        deadline = time.time() + duration
+        for delay in backoff():
+            if self._visible_now(index, wda_elem.kwargs, self._source_once()):
+                log.warning(f"❗ {wda_elem.desc} -> exists.")
+                return False
+            if time.time() >= deadline:
+                return True
+            time.sleep(min(delay, max(deadline - time.time(), 0)))
+
     def wait(self, timeout: int = 5, index: int = 0, noLog=False, **kwargs) -> bool:
-        """等待某元素出现"""
+        """
+        wait for an element to exist: check once right away, then poll at backoff intervals
+        WDA has no server-side wait, every check is one class chain query
+        """
         wda_elem = WDAElement(**kwargs)
-        result = None
         if noLog is False:
             log.info(f"⌛ wait {wda_elem.desc} to exist: {timeout}s.")
-        for _ in range(timeout):
-            result = self.get_display(**wda_elem.kwargs, index=index, noLog=True)
-            time.sleep(1)
-            if result:
+        selector = WDAObj.selector(index, True, **wda_elem.kwargs)
+        deadline = time.time() + timeout
+        for delay in backoff():
+            result = selector.exists
+            if result or time.time() + delay > deadline:
                 break
+            time.sleep(delay)
         if not result:
             if noLog is False:
                 log.warning(f"❗ Element {wda_elem.kwargs} not exist.")
             self.save_screenshot(report=True)
         return result
 
+    def wait_any(self, locators: List[dict], timeout: float = None,
+                 noLog: bool = False) -> Tuple[int, Optional[WDAElementHandle]]:
+        """
+        Wait until any of the elements is visible.
+        Each round checks locators that compile to a class chain with one query each, the others share
+        one page source.
+
+        :param locators: list of locators, may contain index
+        :param timeout: default Seldom.timeout
+        :return: (index of the matched locator, element handle), (-1, None) on timeout
+
+        Usage:
+        n, elem = self.wait_any([{'name': 'Success'}, {'name': 'Retry'}], timeout=10)
+        """
+        if timeout is None:
+            timeout = Seldom.timeout
+        wda_elems = [WDAElement(**locator) for locator in locators]
+        indexes = [getattr(elem, 'index', 0) for elem in wda_elems]
+        desc = ' | '.join(elem.desc for elem in wda_elems)
+        if noLog is False:
+            log.info(f"⌛ wait any of {desc} to exist: {timeout}s.")
+        deadline = time.time() + timeout
+        for delay in backoff():
+            source = self._source_once()
+            for n, (wda_elem, index) in enumerate(zip(wda_elems, indexes)):
+                if self._visible_now(index, wda_elem.kwargs, source):
+                    log.info(f"✅ {wda_elem.desc} -> exists.")
+                    return n, self._handle_now(index, wda_elem.kwargs, source)
+            if time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+        if noLog is False:
+            log.warning(f"❗ None of {desc} exist.")
+        self.save_screenshot(report=True)
+        return -1, None
+
+    def wait_all(self, locators: List[dict], timeout: float = None, noLog: bool = False) -> List[WDAElementHandle]:
+        """
+        Wait until all the elements are visible in the same polling round.
+        Locators that compile to a class chain are checked with one query each, the others share
+        one page source.
+
+        :param locators: list of locators, may contain index
+        :param timeout: default Seldom.timeout
+        :return: element handles in the order of locators, [] on timeout
+        """
+        if timeout is None:
+            timeout = Seldom.timeout
+        wda_elems = [WDAElement(**locator) for locator in locators]
+        indexes = [getattr(elem, 'index', 0) for elem in wda_elems]
+        desc = ' & '.join(elem.desc for elem in wda_elems)
+        if noLog is False:
+            log.info(f"⌛ wait all of {desc} to exist: {timeout}s.")
+        deadline = time.time() + timeout
+        for delay in backoff():
+            source = self._source_once()
+            if all(self._visible_now(index, elem.kwargs, source) for elem, index in zip(wda_elems, indexes)):
+                log.info(f"✅ {desc} -> all exist.")
+                return [self._handle_now(index, elem.kwargs, source) for elem, index in zip(wda_elems, indexes)]
+            if time.time() + delay > deadline:
+                break
+            time.sleep(delay)
+        if noLog is False:
+            log.warning(f"❗ Not all of {desc} exist.")
+        self.save_screenshot(report=True)
+        return []
+
     def wait_gone(self, timeout: int = None, index: int = 0, **kwargs) -> bool:
         """等待元素消失"""
         if not timeout:
@@ -299,7 +529,7 @@ class WDADriver:
         wda_elem = WDAElement(**kwargs)
         log.info(f"⌛ wait {wda_elem.desc} gone: timeout={timeout}s.")
         try:
-            result = WDAObj.s(**kwargs, visible=True, index=index).wait_gone(timeout=timeout)
+            result = WDAObj.selector(index, True, **kwargs).wait_gone(timeout=timeout)
         except Exception as e:
             raise e
 
@@ -309,22 +539,35 @@ class WDADriver:
         return result
 
     @staticmethod
-    def save_screenshot(file_path: str = None, report: bool = False) -> str:
-        """Saves a screenshots of the current window to a PNG image file."""
-        screenshot = Seldom.driver.screenshot()
-        if file_path is None:
-            file_path = os.path.join(AppConfig.PERF_RUN_FOLDER,
-                                     f'{datetime.now().strftime("%Y_%m_%d_%H_%M_%S")}.png')
-
-        log.info(f"📷️ screenshot -> ({file_path}).")
-        screenshot.save(file_path)
-        if report:
-            with open(file_path, "rb") as image_file:
-                image_bytes = image_file.read()
-                base64_data = base64.b64encode(image_bytes)
-                base64_string = base64_data.decode("utf-8")
-            AppConfig.REPORT_IMAGE.extend([base64_string])
-        return file_path
+    def start_flight_recorder(seconds: float = None, fps: int = None) -> FlightRecorder:
+        """
+        Start the flight recorder: only the latest frames of the WDA mjpeg stream are kept in memory,
+        and they are saved as a video when the case fails.
+        :param seconds: seconds to keep, defaults to AppConfig.FLIGHT_SECONDS
+        :param fps: frames per second to keep, defaults to AppConfig.FLIGHT_FPS
+        """
+        if WDADriver.flight_recorder is None or not WDADriver.flight_recorder.running:
+            log.info("📷️ start flight recorder.")
+            WDADriver.flight_recorder = FlightRecorder(iter_mjpeg, seconds=seconds, fps=fps).start()
+        return WDADriver.flight_recorder
+
+    @staticmethod
+    def stop_flight_recorder() -> None:
+        """Stop the flight recorder."""
+        if WDADriver.flight_recorder is not None:
+            WDADriver.flight_recorder.stop()
+            WDADriver.flight_recorder = None
+
+    @staticmethod
+    def save_screenshot(file_path: str = None, report: bool = False, sync: bool = None) -> str:
+        """
+        Saves a screenshot of the current window.
+        :param file_path: defaults to AppConfig.PERF_RUN_FOLDER, in AppConfig.SCREENSHOT_FORMAT
+        :param report: add a thumbnail to the report
+        :param sync: wait until the file is written, defaults to True when file_path is given,
+                     otherwise encoding and writing happen in the background
+        """
+        return ScreenshotWriter.save(Seldom.driver.screenshot(), file_path, report=report, sync=sync)
 
     @staticmethod
     def get_element(index: int = 0, **kwargs):
@@ -390,17 +633,134 @@ class WDADriver:
             if times != 1:
                 time.sleep(1)
 
-    def swipe_up_find(self, times: int = 15, upper: bool = False, index: int = 0, **kwargs):
+    def swipe_up_find(self, times: int = 15, upper: bool = False, index: int = 0, **kwargs) -> int:
+        """
+        Swipe up to find the element, return the number of swipes.
+
+        Usage:
+        self.swipe_up_find(name='login')
+        """
+        return self.scroll_to(direction='up', times=times, upper=upper, index=index, **kwargs)
 
-        swipe_times = 0
+    def scroll_to(self, direction: str = 'up', times: int = 15, upper: bool = False, index: int = 0,
+                  **kwargs) -> int:
+        """
+        Scroll until the element is visible.
+        If the element is already in the accessibility tree, WDA scrolls it to visible in one request.
+        Otherwise swipe on the client, and stop as soon as the page source no longer changes.
+
+        :param direction: swipe direction, up/down/left/right
+        :param times: max swipe times
+        :param upper: swipe in the upper half of the screen
+        :param index: index of the matched elements
+        :return: number of client swipes, 0 if it was visible or scrolled by WDA
+
+        Usage:
+        self.scroll_to(name='login')
+        self.scroll_to(direction='left', height=0.5, name='tab')
+        """
+        swipe_kwargs = {'upper': upper}
+        if 'height' in kwargs:
+            swipe_kwargs['height'] = kwargs.pop('height')
+        swipe = {'up': self.swipe_up, 'down': self.swipe_down,
+                 'left': self.swipe_left, 'right': self.swipe_right}.get(direction)
+        if swipe is None:
+            raise ValueError(f"Invalid direction: {direction}.")
         wda_elem = WDAElement(**kwargs)
-        log.info(f'✅ Swipe to find -> {wda_elem.desc}.')
-        while not self.get_display(**kwargs, index=index):
-            self.swipe_up(upper=upper)
-            swipe_times += 1
-            time.sleep(3.5)
-            if swipe_times > times:
-                raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {wda_elem.desc}.")
+        log.info(f'✅ {wda_elem.desc} -> scroll {direction} to find.')
+        tree = Snapshot.refresh()
+        if self._visible_in_tree(tree, index, wda_elem.kwargs):
+            return 0
+        if self._scroll_into_view(index, wda_elem.kwargs):
+            log.info(f'✅ {wda_elem.desc} -> scrolled into view.')
+            return 0
+        last_fingerprint = tree.fingerprint()
+        for swipe_times in range(1, times + 1):
+            swipe(**swipe_kwargs)
+            tree = Snapshot.refresh()
+            if self._visible_in_tree(tree, index, wda_elem.kwargs):
+                log.info(f'✅ {wda_elem.desc} -> found after {swipe_times} swipes.')
+                return swipe_times
+            fingerprint = tree.fingerprint()
+            if fingerprint == last_fingerprint:
+                raise NotFindElementError(
+                    f"❌ Find element error: reach the end after {swipe_times} swipes, no find -> {wda_elem.desc}.")
+            last_fingerprint = fingerprint
+        raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {wda_elem.desc}.")
+
+    @staticmethod
+    def _visible_in_tree(tree, index: int, kwargs: dict) -> bool:
+        """Whether the element is visible in the page source, ask WDA if the locator is not supported locally."""
+        if tree.supports(**kwargs):
+            return WDADriver._visible_node(tree, index, kwargs) is not None
+        return WDAObj.selector(index, True, **kwargs).exists
+
+    @staticmethod
+    def _visible_node(tree, index: int, kwargs: dict) -> Optional[int]:
+        """The index-th visible node matched in the page source."""
+        ids = [i for i in tree.find(**kwargs) if tree.attribute(i, 'visible') == 'true']
+        return ids[index or 0] if len(ids) > (index or 0) else None
+
+    @staticmethod
+    def _handle_in_tree(tree, index: int, kwargs: dict) -> WDAElementHandle:
+        """
+        Element handle for a visible element in the page source.
+        The bounds come from the source, the element id is resolved on the first action that needs it.
+        """
+        handle = WDAElementHandle(index=index, **kwargs)
+        if tree.supports(**kwargs):
+            lx, ly, rx, ry = tree.bounds(WDADriver._visible_node(tree, index, kwargs))
+            handle.bounds = Rect(lx, ly, rx - lx, ry - ly)
+        return handle
+
+    @staticmethod
+    def _compiled(index: int, kwargs: dict) -> bool:
+        """Whether the visible locator compiles to a class chain query."""
+        query = compile_query(index, True, **kwargs)
+        return query is not None and query[0] == 'class chain'
+
+    @staticmethod
+    def _source_once():
+        """Page source getter that calls WDA source() at most once."""
+        trees = []
+
+        def source():
+            if not trees:
+                trees.append(Snapshot.refresh())
+            return trees[0]
+
+        return source
+
+    @staticmethod
+    def _visible_now(index: int, kwargs: dict, source) -> bool:
+        """
+        Whether the element is visible right now: one class chain query when the locator compiles,
+        otherwise the page source from source().
+        """
+        if WDADriver._compiled(index, kwargs):
+            return WDAObj.selector(index, True, **kwargs).exists
+        return WDADriver._visible_in_tree(source(), index, kwargs)
+
+    @staticmethod
+    def _handle_now(index: int, kwargs: dict, source) -> WDAElementHandle:
+        """Element handle for an element found by _visible_now."""
+        if WDADriver._compiled(index, kwargs):
+            return WDAElementHandle(index=index, **kwargs)
+        return WDADriver._handle_in_tree(source(), index, kwargs)
+
+    @staticmethod
+    def _scroll_into_view(index: int, kwargs: dict) -> bool:
+        """Scroll an element that is in the accessibility tree but off screen to visible."""
+        selector = WDAObj.selector(index, **kwargs)
+        try:
+            if not selector.exists:
+                return False
+            selector.get(timeout=0).scroll('visible')
+        except STALE_ERRORS:
+            return False
+        finally:
+            Snapshot.invalidate()
+        return True
 
     @staticmethod
     def swipe_down(times: int = 1, upper: bool = False, width: float = 0.5, start: float = 0.1,
@@ -433,23 +793,15 @@ class WDADriver:
                 time.sleep(1)
 
     def swipe_left_find(self, times: int = 15, upper: bool = False, height: float = 0.9, index: int = None,
-                        **kwargs) -> None:
+                        **kwargs) -> int:
         """
-        向左滑动寻找元素
+        swipe left to find the element, return the number of swipes
 
         Usage:
         self.swipe_left_find(text='login')
         """
 
-        swipe_times = 0
-        wda_elem = WDAElement(index=index, **kwargs)
-        log.info(f'✅ {wda_elem.desc} -> swipe to find.')
-        while not wda_elem.get_elements(index=index, empty=True, timeout=0.5):
-            self.swipe_left(upper=upper, height=height)
-            swipe_times += 1
-            time.sleep(3.5)
-            if swipe_times > times:
-                raise NotFindElementError(f"❌ Find element error: swipe {times} times no find -> {wda_elem.desc}.")
+        return self.scroll_to(direction='left', times=times, upper=upper, height=height, index=index, **kwargs)
 
     @staticmethod
     def swipe_right(times: int = 1, upper: bool = False, height: float = 0.9, start: float = 0.4,
@@ -483,41 +835,78 @@ class WDADriver:
 wda_ = WDADriver()
 
 
-@contextlib.contextmanager
-def make_screenrecord(t=None, output_video_path='record.mp4'):
-    """
-    iOS录屏上下文管理器
-    这里不指定帧率的话，默认只有10帧/s，但指定帧率视频容易变速
-    """
+def _open_mjpeg(t=None) -> SocketBuffer:
+    """Connect to the WDA mjpeg server"""
     if t is None:
         t = WDAObj.t()
-
     # Read image from WDA mjpeg server
     pconn = t.create_inner_connection(9100)  # default WDA mjpeg server port
-    sock = pconn.get_socket()
-    buf = SocketBuffer(sock)
+    buf = SocketBuffer(pconn.get_socket())
     buf.write(b"GET / HTTP/1.0\r\nHost: localhost\r\n\r\n")
     buf.read_until(b'\r\n\r\n')
+    return buf
+
+
+def _read_mjpeg_frame(buf: SocketBuffer) -> memoryview:
+    """Read one JPEG frame, the returned memoryview is valid until the next frame is read"""
+    # read http header
+    length = None
+    while True:
+        line = bytes(buf.read_until(b'\r\n'))
+        if line.startswith(b"Content-Length"):
+            length = int(line.decode('utf-8').split(": ")[1])
+            break
+    while True:
+        if buf.read_until(b'\r\n') == b'':
+            break
+    return buf.read_bytes(length)
+
+
+def iter_mjpeg(t=None):
+    """Iterate JPEG frames of the WDA mjpeg stream"""
+    buf = _open_mjpeg(t)
+    while True:
+        yield _read_mjpeg_frame(buf)
+
+
+@contextlib.contextmanager
+def make_screenrecord(t=None, output_video_path='record.mp4', passthrough: bool = None, encode: bool = True):
+    """
+    iOS录屏上下文管理器
+    这里不指定帧率的话，默认只有10帧/s，但指定帧率视频容易变速
+    :param passthrough: pass-through mode, the reader does not decode and only appends raw JPEG frames
+                        and arrival times to xxx.mjpeg, default AppConfig.RECORD_PASSTHROUGH
+    :param encode: in pass-through mode, encode output_video_path in a background thread by arrival time,
+                   frames are dropped and counted when the encoder falls behind
+    """
+    if passthrough is None:
+        passthrough = AppConfig.RECORD_PASSTHROUGH
+
+    buf = _open_mjpeg(t)
     log.info(f"📷️ start_recording -> ({output_video_path}).")
 
-    wr = imageio.get_writer(output_video_path)
+    wr = container = encoder = None
+    if passthrough:
+        container = MJPEGWriter(os.path.splitext(output_video_path)[0] + '.mjpeg')
+        if encode:
+            encoder = VideoEncoder(output_video_path).start()
+    else:
+        wr = imageio.get_writer(output_video_path)
+        index = FrameIndexWriter(output_video_path)
 
     def _drain(stop_event, done_event):
         while not stop_event.is_set():
-            # read http header
-            length = None
-            while True:
-                line = buf.read_until(b'\r\n')
-                if line.startswith(b"Content-Length"):
-                    length = int(line.decode('utf-8').split(": ")[1])
-                    break
-            while True:
-                if buf.read_until(b'\r\n') == b'':
-                    break
-
-            imdata = buf.read_bytes(length)
-            im = imageio.imread(io.BytesIO(imdata))
-            wr.append_data(im)
+            imdata = _read_mjpeg_frame(buf)
+            if passthrough:
+                timestamp = time.time()
+                container.append(imdata, timestamp)
+                if encoder is not None:
+                    encoder.put(imdata, timestamp)
+            else:
+                timestamp = time.time()
+                im = imageio.imread(io.BytesIO(imdata))
+                wr.append_data(im)
+                index.append(timestamp)
         done_event.set()
 
     stop_event = threading.Event()
@@ -526,5 +915,12 @@ def make_screenrecord(t=None, output_video_path='record.mp4'):
     yield
     stop_event.set()
     done_event.wait()
-    wr.close()
+    if passthrough:
+        container.close()
+        log.info(f"📷️ Raw frames: {container.frames} -> ({container.path}).")
+        if encoder is not None:
+            encoder.close()
+    else:
+        wr.close()
+        index.close()
     log.info(f"📷️ Record down.")
@@ -0,0 +1,178 @@
+"""
+seldom_atx wda query compiler
+"""
+import re
+from functools import lru_cache
+from typing import Optional, Tuple
+from seldom_atx.logging import log
+from seldom_atx.hierarchy import IOS_ATTRIBUTES
+
+__all__ = ["compile_query"]
+
+ELEMENT_PREFIX = 'XCUIElementType'
+# xpath中的属性 -> 谓词中的属性
+XPATH_ATTRIBUTES = {
+    'name': 'name',
+    'label': 'label',
+    'value': 'value',
+    'type': 'type',
+    'visible': 'visible',
+    'enabled': 'enabled',
+    'accessible': 'accessible',
+}
+BOOL_ATTRIBUTES = ('visible', 'enabled', 'accessible')
+XPATH_FUNCTIONS = {'contains': 'CONTAINS', 'starts-with': 'BEGINSWITH'}
+
+_QUOTED = r"""'[^']*'|"[^"]*\""""
+# 一个xpath步骤：/类型[谓词]...
+_STEP = re.compile(r"/(\*|[A-Za-z]+)((?:\[(?:[^\]'\"]|" + _QUOTED + r")*\])*)")
+_BRACKET = re.compile(r"\[((?:[^\]'\"]|" + _QUOTED + r")*)\]")
+# 谓词中的一个条件：@attr='v' / contains(@attr, 'v') / starts-with(@attr, 'v')
+_CONDITION = re.compile(
+    r"\s*(?:@(\w+)\s*=\s*(" + _QUOTED + r")|(contains|starts-with)\(\s*@(\w+)\s*,\s*(" + _QUOTED + r")\s*\))\s*")
+_AND = re.compile(r"and\b")
+# 已提示过无法转换的xpath，每个xpath只提示一次
+_WARNED = set()
+
+
+def _literal(value) -> str:
+    """谓词中的字符串"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def _type(name: Optional[str]) -> str:
+    if not name or name == '*':
+        return ELEMENT_PREFIX + 'Any'
+    return name if name.startswith(ELEMENT_PREFIX) else ELEMENT_PREFIX + name
+
+
+def _step(type_name: Optional[str], conditions: list) -> Optional[str]:
+    """class chain的一个步骤，谓词中有反引号时无法表示"""
+    step = _type(type_name)
+    if conditions:
+        predicate = ' AND '.join(conditions)
+        if '`' in predicate:
+            return None
+        step += '[`' + predicate + '`]'
+    return step
+
+
+def _xpath_condition(attr: str, op: str, quoted: str) -> Optional[str]:
+    attribute = XPATH_ATTRIBUTES.get(attr)
+    if attribute is None:
+        return None
+    value = quoted[1:-1]
+    if attribute in BOOL_ATTRIBUTES:
+        if op != '==' or value not in ('true', 'false'):
+            return None
+        return f"{attribute} == {1 if value == 'true' else 0}"
+    return f"{attribute} {op} {_literal(value)}"
+
+
+def _xpath_conditions(content: str) -> Optional[list]:
+    """解析 [@a='x' and contains(@b, 'y')]，不支持的写法返回None"""
+    conditions = []
+    pos = 0
+    while True:
+        match = _CONDITION.match(content, pos)
+        if match is None:
+            return None
+        attr, quoted, func, func_attr, func_quoted = match.groups()
+        if attr:
+            condition = _xpath_condition(attr, '==', quoted)
+        else:
+            condition = _xpath_condition(func_attr, XPATH_FUNCTIONS[func], func_quoted)
+        if condition is None:
+            return None
+        conditions.append(condition)
+        pos = match.end()
+        if pos == len(content):
+            return conditions
+        match = _AND.match(content, pos)
+        if match is None:
+            return None
+        pos = match.end()
+
+
+def _compile_xpath(xpath: str) -> Optional[str]:
+    """
+    把简单的xpath转换为class chain：以//开头，之后的步骤为子节点，谓词只有属性比较、contains、starts-with
+    位置谓词([2])在xpath和class chain中的含义不同，不转换
+    """
+    xpath = xpath.strip()
+    if not xpath.startswith('//'):
+        return None
+    steps = []
+    pos = 1
+    while pos < len(xpath):
+        match = _STEP.match(xpath, pos)
+        if match is None:
+            return None
+        conditions = []
+        for content in _BRACKET.findall(match.group(2)):
+            parsed = _xpath_conditions(content)
+            if parsed is None:
+                return None
+            conditions.extend(parsed)
+        step = _step(match.group(1), conditions)
+        if step is None:
+            return None
+        steps.append(step)
+        pos = match.end()
+    return '**/' + '/'.join(steps)
+
+
+def _compile_kwargs(kwargs: dict, visible: Optional[bool]) -> Optional[str]:
+    conditions = []
+    for by, value in kwargs.items():
+        if by == 'className':
+            # className是class chain步骤的类型，不放在谓词中
+            continue
+        if by not in IOS_ATTRIBUTES:
+            return None
+        conditions.append(f"{IOS_ATTRIBUTES[by]} == {_literal(value)}")
+    if visible is not None:
+        conditions.append(f"visible == {1 if visible else 0}")
+    step = _step(kwargs.get('className'), conditions)
+    return None if step is None else '**/' + step
+
+
+@lru_cache(maxsize=1024)
+def _compile(items: tuple, index: int, visible: Optional[bool]) -> Optional[Tuple[str, str]]:
+    kwargs = dict(items)
+    if 'id' in kwargs:
+        if not index:
+            return 'id', kwargs['id']
+        # id查询没有位置，第index个元素按accessibility id(即name)查找
+        chain = '**/' + _step(None, [f"name == {_literal(kwargs['id'])}"])
+    elif 'xpath' in kwargs:
+        chain = _compile_xpath(kwargs['xpath'])
+        if chain is None:
+            xpath = kwargs['xpath']
+            if xpath not in _WARNED:
+                _WARNED.add(xpath)
+                log.warning(f"❗ Locator xpath={xpath} can only run as XPath, "
+                            f"which makes WDA serialize the whole page.")
+            return 'xpath', f"({xpath})[{index + 1}]" if index else xpath
+    else:
+        chain = _compile_kwargs(kwargs, visible)
+        if chain is None:
+            return None
+    return 'class chain', f"{chain}[{index + 1}]" if index else chain
+
+
+def compile_query(index: int = 0, visible: Optional[bool] = None, **kwargs) -> Optional[Tuple[str, str]]:
+    """
+    把定位方式编译为WDA的查询(using, value)，结果会被缓存：
+    name/text/label/value/className -> class chain
+    简单的xpath -> class chain，无法转换时仍使用xpath并提示
+    id -> id，指定了index时 -> class chain
+    无法编译时返回None
+    :param index: 第几个元素，从0开始
+    :param visible: 是否只查找可见元素，xpath不受影响
+    """
+    try:
+        return _compile(tuple(sorted(kwargs.items())), index or 0, visible)
+    except TypeError:
+        # 不可哈希的定位值，不缓存
+        return _compile.__wrapped__(tuple(sorted(kwargs.items())), index or 0, visible)